@@ -0,0 +1,37 @@
+"""
+Benchmarks of the project configuration access
+"""
+import tempfile
+from pathlib import Path
+
+from pyosim import Conf
+
+from . import synthetic
+
+
+class TimeConf:
+    """Configuration fields of every participant of a synthetic project"""
+
+    params = [10, 100]
+    param_names = ['n_participants']
+
+    def setup(self, n_participants):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+        self.participants = synthetic.project(self.path, n_participants=n_participants, n_trials=1, n_frames=10)
+        self.conf = Conf(self.path)
+
+    def teardown(self, n_participants):
+        self.tmp.cleanup()
+
+    def time_load(self, n_participants):
+        Conf(self.path)
+
+    def time_get_conf_field(self, n_participants):
+        for iparticipant in self.conf.get_participants_to_process():
+            self.conf.get_conf_field(iparticipant, ['mass'])
+            self.conf.get_conf_field(iparticipant, ['height'])
+            self.conf.get_conf_field(iparticipant, ['onset'])
+
+    def time_add_conf_field(self, n_participants):
+        self.conf.add_conf_field({iparticipant: {'bench': 1} for iparticipant in self.participants})
@@ -0,0 +1,106 @@
+"""
+Benchmarks of the file readers and writers in pyosim (run with `asv run` or `asv dev`)
+"""
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from pyosim.fileio import read_header, read_sto, read_trc, write_sto, write_trc
+
+from . import synthetic
+
+
+class TimeToTrc:
+    """Bulk trc writer against the frame by frame `osim.TimeSeriesTableVec3` filling"""
+
+    params = ([1000, 10000], [20, 80])
+    param_names = ['n_frames', 'n_markers']
+
+    def setup(self, n_frames, n_markers):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = Path(self.tmp.name) / 'markers.trc'
+
+        self.markers = synthetic.markers(n_frames, n_markers)
+
+    def teardown(self, n_frames, n_markers):
+        self.tmp.cleanup()
+
+    def time_bulk(self, n_frames, n_markers):
+        self.markers.to_trc(self.filename, bulk=True)
+
+    def time_table(self, n_frames, n_markers):
+        self.markers.to_trc(self.filename, bulk=False)
+
+
+class TimeToSto:
+    """Bulk sto writer against the frame by frame `osim.TimeSeriesTable` filling"""
+
+    params = ([20000, 200000], [16])
+    param_names = ['n_frames', 'n_channels']
+
+    def setup(self, n_frames, n_channels):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = Path(self.tmp.name) / 'analogs.sto'
+
+        self.analogs = synthetic.analogs(n_frames, n_channels)
+
+    def teardown(self, n_frames, n_channels):
+        self.tmp.cleanup()
+
+    def time_bulk(self, n_frames, n_channels):
+        self.analogs.to_sto(self.filename, bulk=True)
+
+    def time_bulk_single_precision(self, n_frames, n_channels):
+        self.analogs.to_sto(self.filename, bulk=True, precision=7)
+
+    def time_table(self, n_frames, n_channels):
+        self.analogs.to_sto(self.filename, bulk=False)
+
+
+class MemToTrc:
+    """Peak memory of the chunked trc export of a memory-mapped recording"""
+
+    params = [100000]
+    param_names = ['n_frames']
+
+    def setup(self, n_frames):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = Path(self.tmp.name) / 'markers.trc'
+        self.data = np.lib.format.open_memmap(
+            Path(self.tmp.name) / 'markers.npy', mode='w+', shape=(3, 80, n_frames)
+        )
+        self.data[:] = synthetic.markers_data(n_frames, 80)[:3]
+
+    def teardown(self, n_frames):
+        del self.data
+        self.tmp.cleanup()
+
+    def peakmem_chunked(self, n_frames):
+        write_trc(self.filename, self.data, labels=[f'M{i}' for i in range(80)], rate=200.0, unit='mm')
+
+
+class TimeRead:
+    """Readers, full and header only"""
+
+    params = [10000, 100000]
+    param_names = ['n_frames']
+
+    def setup(self, n_frames):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.trc = Path(self.tmp.name) / 'markers.trc'
+        self.sto = Path(self.tmp.name) / 'emg.sto'
+        write_trc(self.trc, synthetic.markers_data(n_frames, 40), [f'M{i}' for i in range(40)], rate=200.0, unit='mm')
+        write_sto(self.sto, synthetic.analogs_data(n_frames, 16)[0], [f'EMG{i}' for i in range(16)], rate=2000.0)
+
+    def teardown(self, n_frames):
+        self.tmp.cleanup()
+
+    def time_read_trc(self, n_frames):
+        read_trc(self.trc)
+
+    def time_read_sto(self, n_frames):
+        read_sto(self.sto)
+
+    def time_read_header(self, n_frames):
+        read_header(self.trc)
@@ -0,0 +1,24 @@
+"""
+Benchmarks of the package import time, each one in a fresh interpreter
+"""
+
+
+def timeraw_import_pyosim():
+    return 'import pyosim'
+
+
+def timeraw_import_conf():
+    return 'from pyosim import Conf'
+
+
+def timeraw_import_tools():
+    return 'from pyosim import InverseKinematics, StaticOptimization'
+
+
+def track_conf_loads_opensim():
+    """1 if reading the project configuration imports opensim (it should not)"""
+    import subprocess
+    import sys
+
+    code = 'import sys; from pyosim import Conf; print(int("opensim" in sys.modules))'
+    return int(subprocess.check_output([sys.executable, '-c', code]).strip())
@@ -0,0 +1,38 @@
+"""
+Benchmarks of the process pool scaling
+"""
+import tempfile
+from multiprocessing import Pool
+from pathlib import Path
+
+from pyosim.fileio import read_sto, write_sto
+
+from . import synthetic
+
+
+def _export_trial(args):
+    """Synthetic trial export and read back, a CPU bound task of a few hundred ms"""
+    filename, seed = args
+    write_sto(filename, synthetic.analogs_data(100000, 16, seed=seed)[0], [f'EMG{i}' for i in range(16)], rate=2000.0)
+    read_sto(filename)
+
+
+class TimePoolScaling:
+    """Export of a batch of trials on a process pool with an increasing number of workers"""
+
+    params = ([1, 2, 4, 8], [16])
+    param_names = ['processes', 'n_trials']
+    timeout = 600
+
+    def setup(self, processes, n_trials):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tasks = [(Path(self.tmp.name) / f'trial{i}.sto', i) for i in range(n_trials)]
+        self.pool = Pool(processes)
+
+    def teardown(self, processes, n_trials):
+        self.pool.close()
+        self.pool.join()
+        self.tmp.cleanup()
+
+    def time_map(self, processes, n_trials):
+        self.pool.map(_export_trial, self.tasks)
@@ -0,0 +1,124 @@
+"""
+Benchmarks of the OpenSim stages on synthetic trials.
+
+They need a generic model and its setup files, given with environment variables (skipped otherwise):
+    - PYOSIM_BENCH_MODEL: generic model (`.osim`)
+    - PYOSIM_BENCH_TEMPLATES: directory containing `scaling.xml`, `ik.xml`, `id.xml`, `so.xml`, `ma.xml` and `jr.xml`
+"""
+import os
+import tempfile
+from pathlib import Path
+
+from pyosim.fileio import write_trc
+
+from . import synthetic
+
+MODEL = os.environ.get('PYOSIM_BENCH_MODEL')
+TEMPLATES = Path(os.environ.get('PYOSIM_BENCH_TEMPLATES', '.'))
+RATE = 100.0
+N_FRAMES = [200, 2000]
+
+
+def _scale(model_output, static_path, xml_output):
+    from pyosim import Scale
+
+    Scale(
+        model_input=MODEL,
+        model_output=str(model_output),
+        xml_input=str(TEMPLATES / 'scaling.xml'),
+        xml_output=str(xml_output),
+        static_path=str(static_path),
+        mass=70,
+        height=1750,
+        remove_unused=False
+    )
+
+
+def _inverse_kinematics(model, trc_file, mot_output):
+    from pyosim import InverseKinematics
+
+    InverseKinematics(
+        model_input=str(model),
+        xml_input=str(TEMPLATES / 'ik.xml'),
+        xml_output=None,
+        trc_files=trc_file,
+        mot_output=str(mot_output)
+    )
+
+
+class TimeStages:
+    """Scale, IK, ID, SO, MA and JR of one synthetic trial"""
+
+    params = N_FRAMES
+    param_names = ['n_frames']
+    timeout = 1800
+
+    def setup_cache(self):
+        if not MODEL:
+            raise NotImplementedError('PYOSIM_BENCH_MODEL is not set')
+        root = Path(tempfile.mkdtemp(prefix='pyosim-bench-'))
+        for idir in ('_models', '_xml', '0_markers', '1_inverse_kinematic'):
+            (root / idir).mkdir()
+
+        data, labels = synthetic.model_markers(MODEL, n_frames=int(RATE), rate=RATE)
+        write_trc(root / '0_markers' / 'static.trc', data, labels, rate=RATE, unit='mm')
+        _scale(root / '_models' / 'model_scaled.osim', root / '0_markers' / 'static.trc', root / '_xml' / 'scaling.xml')
+
+        for n_frames in N_FRAMES:
+            data, labels = synthetic.model_markers(MODEL, n_frames=n_frames, rate=RATE)
+            trc_file = root / '0_markers' / f'trial{n_frames}.trc'
+            write_trc(trc_file, data, labels, rate=RATE, unit='mm')
+            _inverse_kinematics(root / '_models' / 'model_scaled_markers.osim', trc_file, root / '1_inverse_kinematic')
+        return root
+
+    def setup(self, root, n_frames):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = Path(self.tmp.name)
+        self.model = str(root / '_models' / 'model_scaled_markers.osim')
+        self.trc_file = root / '0_markers' / f'trial{n_frames}.trc'
+        self.mot_file = root / '1_inverse_kinematic' / f'trial{n_frames}.mot'
+
+    def teardown(self, root, n_frames):
+        self.tmp.cleanup()
+
+    def _analyze(self, tool, xml):
+        tool(
+            model_input=self.model,
+            xml_input=str(TEMPLATES / xml),
+            xml_output=str(self.output),
+            sto_output=str(self.output),
+            mot_files=self.mot_file,
+            time_range=[None, -1]
+        )
+
+    def time_scale(self, root, n_frames):
+        _scale(self.output / 'model_scaled.osim', root / '0_markers' / 'static.trc', self.output / 'scaling.xml')
+
+    def time_inverse_kinematics(self, root, n_frames):
+        _inverse_kinematics(self.model, self.trc_file, self.output)
+
+    def time_inverse_dynamics(self, root, n_frames):
+        from pyosim import InverseDynamics
+
+        InverseDynamics(
+            model_input=self.model,
+            xml_input=str(TEMPLATES / 'id.xml'),
+            xml_output=None,
+            mot_files=self.mot_file,
+            sto_output=str(self.output)
+        )
+
+    def time_static_optimization(self, root, n_frames):
+        from pyosim import StaticOptimization
+
+        self._analyze(StaticOptimization, 'so.xml')
+
+    def time_muscle_analysis(self, root, n_frames):
+        from pyosim import MuscleAnalysis
+
+        self._analyze(MuscleAnalysis, 'ma.xml')
+
+    def time_joint_reaction(self, root, n_frames):
+        from pyosim import JointReaction
+
+        self._analyze(JointReaction, 'jr.xml')
@@ -0,0 +1,167 @@
+"""
+Synthetic data for the benchmarks: markers, EMG and forces of configurable length, channel count and trial count
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from pyosim.fileio import write_sto, write_trc
+
+CONF_COLUMNS = ['participant', 'sex', 'laterality', 'group', 'mass', 'height', 'conf_file', 'process']
+
+
+def markers_data(n_frames, n_markers, rate=200.0, seed=0):
+    """Smooth marker trajectories (mm) with shape (4, n_markers, n_frames), in homogeneous coordinates"""
+    rng = np.random.RandomState(seed)
+    time = np.arange(n_frames) / rate
+    offsets = rng.uniform(-1000, 1000, size=(3, n_markers, 1))
+    amplitudes = rng.uniform(10, 200, size=(3, n_markers, 1))
+    frequencies = rng.uniform(0.1, 2, size=(3, n_markers, 1))
+    data = np.ones((4, n_markers, n_frames))
+    data[:3] = offsets + amplitudes * np.sin(2 * np.pi * frequencies * time) + rng.normal(0, 0.5, (3, n_markers, n_frames))
+    return data
+
+
+def analogs_data(n_frames, n_channels, seed=0):
+    """EMG-like signals (zero mean noise modulated by slow envelopes) with shape (1, n_channels, n_frames)"""
+    rng = np.random.RandomState(seed)
+    envelope = 0.5 + 0.5 * np.sin(np.linspace(0, 20, n_frames) + rng.uniform(0, np.pi, size=(n_channels, 1)))
+    return (envelope * rng.normal(0, 1e-4, size=(n_channels, n_frames)))[np.newaxis]
+
+
+def forces_data(n_frames, n_plates=1, seed=0):
+    """Force plate signals (force, point, moment for each plate) with shape (9 * n_plates, n_frames)"""
+    rng = np.random.RandomState(seed)
+    time = np.linspace(0, 1, n_frames)
+    data = rng.normal(0, 1, size=(9 * n_plates, n_frames))
+    data[1::9] += 700 * (1 + 0.2 * np.sin(2 * np.pi * time))  # vertical force
+    return data
+
+
+def markers(n_frames, n_markers, rate=200.0, seed=0):
+    """Synthetic `Markers3dOsim`"""
+    from pyosim import Markers3dOsim
+
+    out = Markers3dOsim(markers_data(n_frames, n_markers, rate, seed))
+    out.get_rate = rate
+    out.get_unit = 'mm'
+    out.get_labels = [f'M{i}' for i in range(n_markers)]
+    return out
+
+
+def analogs(n_frames, n_channels, rate=2000.0, seed=0):
+    """Synthetic `Analogs3dOsim`"""
+    from pyosim import Analogs3dOsim
+
+    out = Analogs3dOsim(analogs_data(n_frames, n_channels, seed))
+    out.get_rate = rate
+    out.get_labels = [f'EMG{i}' for i in range(n_channels)]
+    return out
+
+
+def project(path, n_participants=10, n_trials=5, n_frames=1000, n_markers=40, n_channels=16, rate=200.0,
+            analog_rate=2000.0):
+    """
+    Write a synthetic pyosim project: configuration files and, for each participant, marker (`.trc`),
+    EMG (`.sto`) and forces (`.sto`) trials
+
+    Parameters
+    ----------
+    path : Path
+        project directory
+    n_participants : int
+        number of participants
+    n_trials : int
+        number of trials per participant
+    n_frames : int
+        number of marker frames per trial
+    n_markers : int
+        number of markers
+    n_channels : int
+        number of EMG channels
+    rate : float
+        markers rate (Hz)
+    analog_rate : float
+        EMG and forces rate (Hz)
+
+    Returns
+    -------
+    list
+        participants
+    """
+    from pyosim.project import PARTICIPANT_DIRS
+
+    participants = [f'p{i:03d}' for i in range(n_participants)]
+    n_analogs = int(n_frames * analog_rate / rate)
+    rows = []
+    for i, iparticipant in enumerate(participants):
+        for idir in PARTICIPANT_DIRS:
+            (path / iparticipant / idir).mkdir(parents=True, exist_ok=True)
+
+        conf_file = (path / iparticipant / '_conf.json').resolve()
+        mass, height = 50 + i % 40, 150 + i % 45
+        onsets = {f'trial{j}': [0.0, (n_frames - 1) / rate] for j in range(n_trials)}
+        with open(conf_file, 'w') as file:
+            json.dump({'participant': iparticipant, 'mass': mass, 'height': height, 'onset': onsets}, file)
+        rows.append([iparticipant, i % 2, 1, i % 2, mass, height, str(conf_file), 1])
+
+        for j in range(n_trials):
+            write_trc(
+                path / iparticipant / '0_markers' / f'trial{j}.trc', markers_data(n_frames, n_markers, rate, seed=j),
+                labels=[f'M{k}' for k in range(n_markers)], rate=rate, unit='mm', decimals=4
+            )
+            write_sto(
+                path / iparticipant / '0_emg' / f'trial{j}.sto', analogs_data(n_analogs, n_channels, seed=j)[0],
+                labels=[f'EMG{k}' for k in range(n_channels)], rate=analog_rate
+            )
+            write_sto(
+                path / iparticipant / '0_forces' / f'trial{j}.sto', forces_data(n_analogs, seed=j),
+                labels=[f'plate1_{k}' for k in ('vx', 'vy', 'vz', 'px', 'py', 'pz', 'torque_x', 'torque_y', 'torque_z')],
+                rate=analog_rate
+            )
+
+    pd.DataFrame(rows, columns=CONF_COLUMNS).to_csv(path / '_conf.csv', index=False)
+    return participants
+
+
+def model_markers(model_path, n_frames, rate=100.0, amplitude=5.0, seed=0):
+    """
+    Marker trajectories (mm) oscillating around the markers of an OpenSim model in its default pose,
+    so that the synthetic trials can be processed by the OpenSim tools
+
+    Parameters
+    ----------
+    model_path : str, Path
+        OpenSim model (`.osim`)
+    n_frames : int
+        number of frames
+    rate : float
+        data rate (Hz)
+    amplitude : float
+        amplitude of the oscillations (mm)
+    seed : int
+        random seed
+
+    Returns
+    -------
+    tuple
+        (data with shape (3, n_markers, n_frames), labels)
+    """
+    import opensim as osim
+
+    model = osim.Model(str(model_path))
+    state = model.initSystem()
+    marker_set = model.getMarkerSet()
+    labels, positions = [], []
+    for imarker in range(marker_set.getSize()):
+        marker = marker_set.get(imarker)
+        location = marker.getLocationInGround(state)
+        labels.append(marker.getName())
+        positions.append([location.get(0), location.get(1), location.get(2)])
+
+    rng = np.random.RandomState(seed)
+    time = np.arange(n_frames) / rate
+    phases = rng.uniform(0, 2 * np.pi, size=(3, len(labels), 1))
+    data = np.array(positions).T[..., np.newaxis] * 1000 + amplitude * np.sin(2 * np.pi * 0.5 * time + phases)
+    return data, labels
@@ -1,15 +1,10 @@
-from .scale import *
-from .project import *
-from .model import *
-from .conf import *
-from .inverse_kinematics import *
-from .inverse_dynamics import *
-from .analyse_tool import *
-from .static_optimization import *
-from .muscle_analysis import *
-from .joint_reaction import *
-from .analogs import *
-from .markers import *
+"""
+pyosim: OpenSim pipelines in python.
+Submodules are imported on first access to one of their names, so that importing pyosim (for
+example to read the project configuration with `Conf`) does not load opensim and pyomeca until a
+tool is used.
+"""
+from importlib import import_module
 
 __author__ = "Romain Martinez"
 __version__ = "0.1.0"
@@ -18,3 +13,56 @@ from ._version import get_versions
 
 __version__ = get_versions()["version"]
 del get_versions
+
+# public names of each submodule
+_SUBMODULES = {
+    'scale': ['Scale', 'batch_scale'],
+    'project': ['PARTICIPANT_DIRS', 'Project'],
+    'model': ['Model'],
+    'conf': ['Conf', 'dict_merge', 'write_json'],
+    'inverse_kinematics': ['InverseKinematics'],
+    'inverse_dynamics': ['InverseDynamics'],
+    'analyse_tool': ['AnalyzeTool'],
+    'static_optimization': ['StaticOptimization'],
+    'muscle_analysis': ['MuscleAnalysis'],
+    'joint_reaction': ['JointReaction'],
+    'analogs': ['Analogs3dOsim'],
+    'markers': ['Markers3dOsim'],
+    'fileio': [
+        'CHUNK_SIZE', 'FORMAT_SIZE', 'STOWriter', 'TRCWriter', 'iter_blocks', 'read_header',
+        'read_sto',
+        'read_time_range', 'read_trc', 'stitch', 'time_windows', 'trial_filename', 'write_sto',
+        'write_trc',
+    ],
+    'parallel': [
+        'CACHE_SIZE', 'MIN_ELAPSED', 'CostModel', 'ParallelTool', 'balanced_map', 'cached',
+        'clear_cache', 'close_pool', 'dispatch', 'file_key', 'get_pool', 'run_windows',
+        'scratch_dir', 'scratch_file', 'scratch_folder',
+    ],
+    'manifest': ['MANIFEST_NAME', 'Manifest', 'file_signature', 'inputs_signature'],
+    'pipeline': ['STAGES', 'Pipeline', 'Stage'],
+    'instrumentation': [
+        'JSONLinesSink', 'LoggingSink', 'get_sink', 'measure', 'peak_rss', 'set_sink',
+    ],
+    'index': ['INDEX_NAME', 'MTIME_GRANULARITY_NS', 'FileIndex', 'is_trial_file'],
+    'store': ['PARTICIPANT_COLUMNS', 'STORE_NAME', 'ProjectStore'],
+}
+
+_NAMES = {iname: imodule for imodule, inames in _SUBMODULES.items() for iname in inames}
+
+__all__ = sorted(_NAMES)
+
+
+def __getattr__(name):
+    if name in _NAMES:
+        value = getattr(import_module(f'.{_NAMES[name]}', __name__), name)
+    elif name in _SUBMODULES:
+        value = import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # next accesses do not go through __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_SUBMODULES))
@@ -5,6 +5,8 @@ import opensim as osim
 
 from pyomeca import Analogs
 
+from pyosim.fileio import CHUNK_SIZE, write_sto
+
 
 class Analogs3dOsim(Analogs):
     def __new__(cls, *args, **kwargs):
@@ -17,7 +19,7 @@ class Analogs3dOsim(Analogs):
         if obj is None or not isinstance(obj, Analogs3dOsim):
             return
 
-    def to_sto(self, filename, metadata=None):
+    def to_sto(self, filename, metadata=None, bulk=True, precision=16, chunk_size=CHUNK_SIZE):
         """
         Write a sto file from a Analogs3dOsim
         Parameters
@@ -26,12 +28,37 @@ class Analogs3dOsim(Analogs):
             path of the file to write
         metadata : dict, optional
             dict with optional metadata to add in the output file
+        bulk : bool, optional
+            write the whole time x channel matrix at once instead of filling an
+            `osim.TimeSeriesTable` frame by frame
+        precision : int, optional
+            number of significant digits written by the bulk writer (lower it for smaller files)
+        chunk_size : int, optional
+            number of frames read at once by the bulk writer (bounds memory on long recordings)
         """
         filename = Path(filename)
         # Make sure the directory exists, otherwise create it
         if not filename.parents[0].is_dir():
             filename.parents[0].mkdir()
 
+        time_vector = np.arange(
+            start=0, stop=1 / self.get_rate * self.shape[2], step=1 / self.get_rate
+        )
+
+        if bulk:
+            metadata = dict(metadata) if metadata else {}
+            metadata.setdefault('OpenSimVersion', osim.GetVersion())
+            write_sto(
+                filename,
+                data=np.asarray(self).reshape(-1, self.shape[-1]),
+                labels=self.get_labels,
+                time=time_vector,
+                metadata=metadata,
+                precision=precision,
+                chunk_size=chunk_size
+            )
+            return
+
         table = osim.TimeSeriesTable()
 
         # set metadata
@@ -45,8 +72,6 @@ class Analogs3dOsim(Analogs):
             table.addTableMetaDataString('nColumns', str(self.shape[1]))
         table.addTableMetaDataString('nRows', str(self.shape[-1]))
 
-        time_vector = np.arange(start=0, stop=1 / self.get_rate * self.shape[2], step=1 / self.get_rate)
-
         for iframe in range(self.shape[-1]):
             a = self.get_frame(iframe)
             row = osim.RowVector(a.ravel().tolist())
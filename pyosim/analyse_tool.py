@@ -2,12 +2,20 @@
 Analyze tool class in pyosim.
 Used in static optimization, muscle analysis and joint reaction analysis.
 """
+import os
 from pathlib import Path
 import numpy as np
 import opensim as osim
 
+from pyosim.fileio import read_header, read_time_range
+from pyosim.instrumentation import measure
+from pyosim.manifest import Manifest, inputs_signature
+from pyosim.parallel import (
+    ParallelTool, cached, dispatch, file_key, run_windows, scratch_file, scratch_folder,
+)
 
-class AnalyzeTool:
+
+class AnalyzeTool(ParallelTool):
     """
     Analyze tool in pyosim.
     Used in static optimization, muscle analysis and joint reaction analysis.
@@ -26,8 +34,9 @@ class AnalyzeTool:
         Path of the directory containing the external forces files (`.sto`) (Optional)
     muscle_forces_dir : str, optional
         Path of the directory containing the muscle forces files (`.sto`) (Optional)
-    mot_files : str, Path, list
-        Path or list of path to the directory containing the motion files (`.mot`)
+    mot_files : str, Path, list, None
+        Path or list of path to the directory containing the motion files (`.mot`).
+        If None, the trials are the keys of `coordinates`
     sto_output : Path, str
         Output directory
     xml_actuators: Path, str
@@ -37,7 +46,40 @@ class AnalyzeTool:
     low_pass : int, optional
         Cutoff frequency for an optional low pass filter on coordinates (Optional)
     remove_empty_files : bool, optional
-        remove empty files i in `sto_output` if True (Optional)
+        remove empty outputs of the trials in `sto_output` if True, once all the trials are
+        processed (Optional)
+    incremental : bool, optional
+        Skip trials whose inputs (model, setup files, motion and forces files) did not change since
+        their outputs were produced, according to the manifest stored in `sto_output`
+    instrument : callable, optional
+        Sink receiving the timing and memory events of each phase (default: `pyosim.set_sink`)
+    coordinates : dict, optional
+        Coordinates (in degrees) of the trials already in memory, as `osim.Storage` with the motion
+        file stem as key (typically `InverseKinematics(..., keep_kinematics=True).kinematics`).
+        These trials do not read their motion file and are not tracked by the manifest.
+        Cannot be used with `multi` nor `xml_forces`
+    analyses : list, optional
+        Analyses attached to a single AnalyzeTool run per trial (`StaticOptimization`,
+        `MuscleAnalysis`, `JointReaction`), so that the coordinates are loaded, filtered and
+        realized once. Their parameters are read from the nodes of the same name in `xml_input`
+        (default: the analysis of the class).
+        A `JointReaction` run with a `StaticOptimization` still needs the muscle forces of a
+        previous run (`forces_file`) to account for muscle forces.
+        The muscle equilibrium is solved for all the attached analyses when `MuscleAnalysis` is
+        included, as in a standalone `MuscleAnalysis` run. Combined with it, `StaticOptimization`
+        starts from equilibrated muscle states and its results can differ from a standalone
+        `StaticOptimization` run (models with compliant tendons)
+    shards : int, optional
+        Split each trial into this number of time windows whose `.sto` results are stitched (see
+        `pyosim.parallel.run_windows`)
+    overlap : float, optional
+        Duration (s) added on each side of the windows
+    cost_model : CostModel, optional
+        Cost model of the stage used with `multi` (see `pyosim.parallel.dispatch`)
+    index : FileIndex, optional
+        Index of the project containing `sto_output`. The existing outputs of the trials are looked
+        up in it instead of listing `sto_output`, and its entry of `sto_output` is refreshed once
+        the trials are processed
     multi : bool, optional
         Launch AnalyzeTool in multiprocessing if True
 
@@ -45,14 +87,15 @@ class AnalyzeTool:
     --------
     >>> from pathlib import Path
     >>>
-    >>> from pyosim import AnalyzeTool
+    >>> from pyosim import AnalyzeTool, FileIndex
     >>>
     >>> PROJECT_PATH = Path('../Misc/project_sample')
     >>> TEMPLATES_PATH = PROJECT_PATH / '_templates'
     >>>
     >>> participant = 'dapo'
     >>> model = 'wu'
-    >>> trials = [ifile for ifile in (PROJECT_PATH / participant / '1_inverse_kinematic').glob('*.mot')]
+    >>> index = FileIndex(PROJECT_PATH)
+    >>> trials = index.files(participant, '1_inverse_kinematic', suffix='.mot')
     >>>
     >>> path_kwargs = {
     >>>     'model_input': f"{(PROJECT_PATH / participant / '_models' / model).resolve()}_scaled_markers.osim",
@@ -69,7 +112,19 @@ class AnalyzeTool:
     >>>     **path_kwargs,
     >>>     mot_files=trials,
     >>>     prefix=model,
-    >>>     low_pass=5
+    >>>     low_pass=5,
+    >>>     index=index
+    >>> )
+    >>> index.save()
+    >>>
+    >>> # static optimization and muscle analysis in a single pass (setup file with both analyses),
+    >>> # static optimization then runs with the muscle equilibrium solved
+    >>> AnalyzeTool(
+    >>>     **path_kwargs,
+    >>>     mot_files=trials,
+    >>>     prefix=model,
+    >>>     low_pass=5,
+    >>>     analyses=['StaticOptimization', 'MuscleAnalysis']
     >>> )
     """
 
@@ -92,6 +147,14 @@ class AnalyzeTool:
         contains=None,
         print_to_xml=False,
         time_range=None,
+        incremental=False,
+        instrument=None,
+        coordinates=None,
+        analyses=None,
+        shards=None,
+        overlap=0.5,
+        cost_model=None,
+        index=None,
     ):
         self.model_input = model_input
         self.xml_input = xml_input
@@ -108,8 +171,26 @@ class AnalyzeTool:
         self.multi = multi
         self.contains = contains
         self.print_to_xml = print_to_xml
+        self.manifest = Manifest(sto_output) if incremental else None
+        self.instrument = instrument
+        self.coordinates = coordinates or {}
+        self.analyses = analyses if analyses else [self.get_class_name()]
+        self.shards = shards
+        self.overlap = overlap
+        self.cost_model = cost_model
+        self.index = index
+        self.existing_outputs = []
         self.start_time, self.end_time = None, None
 
+        if self.coordinates and multi:
+            raise ValueError(
+                'coordinates in memory cannot be sent to worker processes, use multi=False'
+            )
+        if self.coordinates and xml_forces:
+            raise ValueError(
+                'external loads require the motion files, use mot_files instead of coordinates'
+            )
+
         if isinstance(time_range, (list, np.ndarray)):
             self.start_time = time_range[0]
             self.end_time = time_range[1]
@@ -117,6 +198,8 @@ class AnalyzeTool:
         else:
             raise RuntimeError("Time range must be a list or an array of start and last time frame.")
 
+        if mot_files is None:
+            mot_files = list(self.coordinates)
         if not isinstance(mot_files, list):
             self.mot_files = [mot_files]
         else:
@@ -128,118 +211,263 @@ class AnalyzeTool:
         self.main_loop()
 
     def main_loop(self):
-        if self.multi:
-            import os
-            from multiprocessing import Pool
-
-            pool = Pool(os.cpu_count())
-            pool.map(self.run_analyze_tool, self.mot_files)
+        # outputs of previous runs, listed once for the up-to-date checks of all the trials
+        self.existing_outputs = self.output_files() if self.manifest else []
+        if self.shards:
+            results = self.run_sharded()
+            if self.manifest:
+                self.manifest.record(results)
+        elif self.multi:
+            n_frames = [read_header(itrial)['n_frames'] for itrial in self.mot_files]
+            results = dispatch(
+                "+".join(self.analyses), self.run_analyze_tool, self.mot_files, n_frames,
+                cost_model=self.cost_model
+            )
+            if self.manifest:
+                self.manifest.record(results)
         else:
             for itrial in self.mot_files:
-                self.run_analyze_tool(itrial)
+                result = self.run_analyze_tool(itrial)
+                if self.manifest:
+                    self.manifest.record([result])
+        self.cleanup(self.mot_files)
+        if self.index is not None:
+            self.index.listdir(Path(self.sto_output).resolve(), stat_files=True)
+
+    def cleanup(self, trials):
+        """
+        Remove the empty outputs (`remove_empty_files`) and the outputs not containing `contains` of
+        a batch of trials.
+        The output directory is listed once per batch and only the outputs of these trials are
+        considered, so that other runs writing in the same directory are not affected.
 
-    def run_analyze_tool(self, trial):
+        Parameters
+        ----------
+        trials : list
+            motion files of the batch
+        """
+        if not (self.remove_empty_files or self.contains):
+            return
+        current_class = "+".join(self.analyses)
+        prefixes = tuple(f"{itrial.stem}_{iname}_" for itrial in trials for iname in self.analyses)
+        with measure(current_class, None, 'cleanup', self.instrument):
+            files = [
+                Path(self.sto_output, iname) for iname in self.output_files()
+                if iname.startswith(prefixes)
+            ]
+
+            if self.remove_empty_files:
+                files = self._remove_empty_files(directory=self.sto_output, files=files)
+
+            if self.contains:
+                self._subset_output(directory=self.sto_output, contains=self.contains, files=files)
+
+    def ext_forces_file(self, trial):
+        """
+        External forces file (`.sto`) of a trial
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+
+        Returns
+        -------
+        str
+        """
+        stem = trial.stem.replace(f'{self.prefix}_', '') if self.prefix else trial.stem
+        return f"{Path(self.ext_forces_dir, stem).resolve()}.sto"
+
+    def trial_signature(self, trial):
+        """
+        Signature of the inputs of a trial, None if it cannot be computed (model given as an
+        `osim.Model`)
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+
+        Returns
+        -------
+        dict or None
+        """
+        if not isinstance(self.model_input, str):
+            return None
+        inputs = [self.model_input, self.xml_input, trial, self.xml_actuators, self.forces_file]
+        if self.xml_forces:
+            inputs += [self.xml_forces, self.ext_forces_file(trial)]
+        params = {
+            'low_pass': self.low_pass, 'start_time': self.start_time, 'end_time': self.end_time
+        }
+        return inputs_signature(inputs, params=params)
+
+    def time_range(self, trial):
+        """
+        First and last time analyzed in a trial: `time_range` if given, else the range of the motion
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+
+        Returns
+        -------
+        tuple
+        """
+        coordinates = self.coordinates.get(trial.stem)
+        if coordinates is None:
+            with measure("+".join(self.analyses), trial.stem, 'read_header', self.instrument):
+                motion_first_time, motion_last_time = read_time_range(trial)
+        else:
+            motion_first_time = coordinates.getFirstTime()
+            motion_last_time = coordinates.getLastTime()
+        if self.start_time:
+            first_time = self.start_time
+        else:
+            first_time = motion_first_time
+        if self.end_time and self.end_time != -1:
+            last_time = self.end_time
+        else:
+            last_time = motion_last_time
+        return first_time, last_time
+
+    def output_files(self):
+        """Names of the files in `sto_output`, from the `index` if given"""
+        if self.index is not None:
+            return list(self.index.listdir(Path(self.sto_output).resolve()))
+        try:
+            with os.scandir(self.sto_output) as it:
+                return [ientry.name for ientry in it]
+        except FileNotFoundError:
+            return []
+
+    def trial_outputs(self, trial):
+        """Output files of a trial in `sto_output`, among the outputs listed before the batch"""
+        prefixes = tuple(f"{trial.stem}_{iname}_" for iname in self.analyses)
+        return [
+            Path(self.sto_output, iname) for iname in sorted(self.existing_outputs)
+            if iname.startswith(prefixes)
+        ]
+
+    def run_sharded(self):
+        """
+        Run each trial as `shards` overlapping time windows (in parallel with `multi`) and stitch
+        their results.
+        Only the `.sto` results are stitched, the other files of the windows (such as controls) are
+        discarded.
+
+        Returns
+        -------
+        list
+            manifest entry (or None) of each trial
+        """
+        results, trials = [], []
+        for itrial in self.mot_files:
+            if self.prefix and not itrial.stem.startswith(self.prefix):
+                # skip file if user specified a prefix and prefix is not present in current file
+                continue
+            key = f"{'+'.join(self.analyses)}/{itrial.stem}"
+            signature = None
+            if self.manifest and itrial.stem not in self.coordinates:
+                signature = self.trial_signature(itrial)
+            if signature and self.manifest.is_up_to_date(
+                    key, signature, self.trial_outputs(itrial)
+            ):
+                print(f"\t{itrial.stem} (up to date)")
+                continue
+            trials.append((itrial, self.time_range(itrial), self.sto_output))
+            results.append((key, signature) if signature else None)
+
+        run_windows(
+            "+".join(self.analyses), self.run_analyze_tool, trials, self.shards, self.overlap,
+            multi=self.multi, instrument=self.instrument
+        )
+        return results
+
+    def run_analyze_tool(self, trial, time_range=None):
+        """
+        Run the analyses of a trial
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+        time_range : tuple, optional
+            first and last times of a window of the trial, analyzed in a scratch directory to be
+            stitched (default: whole trial)
+
+        Returns
+        -------
+        tuple or str or None
+            manifest entry (or None) of the trial, or results directory of the window
+        """
         if self.prefix and not trial.stem.startswith(self.prefix):
             # skip file if user specified a prefix and prefix is not present in current file
             pass
         else:
-            print(f"\t{trial.stem}")
+            current_class = "+".join(self.analyses)
+            key = f"{current_class}/{trial.stem}"
+            coordinates = self.coordinates.get(trial.stem)
+
+            signature = None
+            if time_range is None:
+                if self.manifest and coordinates is None:
+                    signature = self.trial_signature(trial)
+                if signature and self.manifest.is_up_to_date(
+                        key, signature, self.trial_outputs(trial)
+                ):
+                    print(f"\t{trial.stem} (up to date)")
+                    return None
+                print(f"\t{trial.stem}")
+                results_dir = self.sto_output
+            else:
+                print(f"\t{trial.stem} [{time_range[0]:.2f}, {time_range[1]:.2f}]")
+                results_dir = scratch_folder(trial.stem)
 
             # model
-            model = osim.Model(self.model_input) if isinstance(self.model_input, str) is True else self.model_input
-            model.initSystem()
+            with measure(current_class, trial.stem, 'load_model', self.instrument):
+                model, with_actuators = self.load_model()
 
             # get starting and ending time
-            motion = osim.Storage(f"{trial.resolve()}")
-            if self.start_time:
-                first_time = self.start_time
-            else:
-                first_time = motion.getFirstTime()
-            if self.end_time and self.end_time != -1:
-                last_time = self.end_time
-            else:
-                last_time = motion.getLastTime()
+            first_time, last_time = time_range if time_range else self.time_range(trial)
 
             # prepare external forces xml file
             if self.xml_forces:
-                external_loads = osim.ExternalLoads(self.xml_forces, True)
-                if self.prefix:
-                    external_loads.setDataFileName(
-                        f"{Path(self.ext_forces_dir, trial.stem.replace(f'{self.prefix}_', '')).resolve()}.sto"
+                with measure(current_class, trial.stem, 'external_loads', self.instrument):
+                    external_loads = osim.ExternalLoads(self.xml_forces, True)
+                    external_loads.setDataFileName(self.ext_forces_file(trial))
+                    external_loads.setExternalLoadsModelKinematicsFileName(
+                        f"{trial.resolve()}"
                     )
-                else:
-                    external_loads.setDataFileName(
-                        f"{Path(self.ext_forces_dir, trial.stem).resolve()}.sto"
+                    if self.low_pass:
+                        external_loads.setLowpassCutoffFrequencyForLoadKinematics(
+                            self.low_pass
+                        )
+                    temp_xml = scratch_file(f"{trial.stem}_external_loads")
+                    external_loads.printToXML(f"{temp_xml}")  # temporary xml file
+
+            with measure(current_class, trial.stem, 'parse_setup', self.instrument):
+                params = {
+                    iname: cached(
+                        ('AnalyzeSet', file_key(self.xml_input), iname),
+                        lambda iname=iname: self.parse_analyze_set_xml(self.xml_input, node=iname)
                     )
-                external_loads.setExternalLoadsModelKinematicsFileName(
-                    f"{trial.resolve()}"
-                )
-                if self.low_pass:
-                    external_loads.setLowpassCutoffFrequencyForLoadKinematics(
-                        self.low_pass
-                    )
-                temp_xml = Path(f"{trial.stem}_temp.xml")
-                external_loads.printToXML(f"{temp_xml.resolve()}")  # temporary xml file
-
-            current_class = self.get_class_name()
-            params = self.parse_analyze_set_xml(self.xml_input, node=current_class)
-            solve_for_equilibrium = False
-            if current_class == "StaticOptimization":
-                analysis = osim.StaticOptimization(model)
-                analysis.setUseModelForceSet(params["use_model_force_set"])
-                analysis.setActivationExponent(params["activation_exponent"])
-                analysis.setUseMusclePhysiology(params["use_muscle_physiology"])
-                analysis.setConvergenceCriterion(
-                    params["optimizer_convergence_criterion"]
-                )
-                analysis.setMaxIterations(int(params["optimizer_max_iterations"]))
-            elif current_class == "MuscleAnalysis":
-                solve_for_equilibrium = True
-                analysis = osim.MuscleAnalysis(model)
-                coord = osim.ArrayStr()
-                for c in params["moment_arm_coordinate_list"]:
-                    coord.append(c)
-                analysis.setCoordinates(coord)
-
-                mus = osim.ArrayStr()
-                for m in params["muscle_list"]:
-                    mus.append(m)
-                analysis.setMuscles(mus)
-                # analysis.setComputeMoments(params["compute_moments"])
-            elif current_class == "JointReaction":
-                # construct joint reaction analysis
-                analysis = osim.JointReaction(model)
-                if params["forces_file"] or self.forces_file:
-                    force_file = self.forces_file if self.forces_file else params["forces_file"]
-                    analysis.setForcesFileName(force_file)
-
-                joint = osim.ArrayStr()
-                for j in params["joint_names"]:
-                    joint.append(j)
-                analysis.setJointNames(joint)
-
-                body = osim.ArrayStr()
-                for b in params["apply_on_bodies"]:
-                    body.append(b)
-                analysis.setOnBody(body)
-
-                frame = osim.ArrayStr()
-                for f in params["express_in_frame"]:
-                    frame.append(f)
-                analysis.setInFrame(frame)
-            else:
-                raise ValueError("AnalyzeTool must be called from a child class")
-            analysis.setModel(model)
-            analysis.setName(current_class)
-            analysis.setOn(params["on"])
-            analysis.setStepInterval(int(params["step_interval"]))
-            analysis.setInDegrees(params["in_degrees"])
-            analysis.setStartTime(first_time)
-            analysis.setEndTime(last_time)
-            model.addAnalysis(analysis)
-
-            if self.print_to_xml is True:
-                analysis.printToXML(f"{self.xml_output}/{current_class}_analysis.xml")
+                    for iname in self.analyses
+                }
+            analyses = []
+            for iname in self.analyses:
+                analysis = self._build_analysis(iname, model, params[iname])
+                analysis.setStartTime(first_time)
+                analysis.setEndTime(last_time)
+                model.addAnalysis(analysis)
+                analyses.append(analysis)
+
+                if self.print_to_xml is True:
+                    analysis.printToXML(f"{self.xml_output}/{iname}_analysis.xml")
+            # one tool for all the analyses: the equilibrium required by MuscleAnalysis also applies
+            # to the others
+            solve_for_equilibrium = "MuscleAnalysis" in self.analyses
 
             # analysis tool
             analyze_tool = osim.AnalyzeTool(model)
@@ -249,10 +477,7 @@ class AnalyzeTool:
             analyze_tool.setSolveForEquilibrium(solve_for_equilibrium)
 
             if self.xml_actuators:
-                force_set = osim.ArrayStr()
-                force_set.append(self.xml_actuators)
-                analyze_tool.setForceSetFiles(force_set)
-                analyze_tool.updateModelForces(model, self.xml_actuators)
+                self._set_actuators(analyze_tool, model, update_model=not with_actuators)
 
             analyze_tool.setInitialTime(first_time)
             analyze_tool.setFinalTime(last_time)
@@ -260,25 +485,139 @@ class AnalyzeTool:
             if self.low_pass:
                 analyze_tool.setLowpassCutoffFrequency(self.low_pass)
 
-            analyze_tool.setCoordinatesFileName(f"{trial.resolve()}")
-            if self.xml_forces:
-                analyze_tool.setExternalLoadsFileName(f"{temp_xml}")
-            analyze_tool.setLoadModelAndInput(True)
-            analyze_tool.setResultsDir(f"{self.sto_output}")
+            if coordinates is None:
+                analyze_tool.setCoordinatesFileName(f"{trial.resolve()}")
+                if self.xml_forces:
+                    analyze_tool.setExternalLoadsFileName(f"{temp_xml}")
+                analyze_tool.setLoadModelAndInput(True)
+            else:
+                # filter a copy of the coordinates as the tool does when it loads them from file
+                motion = osim.Storage(coordinates)
+                if self.low_pass:
+                    motion.pad(motion.getSize() // 2)
+                    motion.lowpassIIR(self.low_pass)
+                analyze_tool.setStatesFromMotion(model.initSystem(), motion, True)
+                analyze_tool.setLoadModelAndInput(False)
+            analyze_tool.setResultsDir(f"{results_dir}")
 
-            analyze_tool.run()
+            try:
+                with measure(current_class, trial.stem, 'solve', self.instrument):
+                    analyze_tool.run()
+            finally:
+                # Remove analyses
+                for analysis in analyses:
+                    model.removeAnalysis(analysis)
 
-            # Remove analysis
-            model.removeAnalysis(analysis)
+                if self.xml_forces:
+                    temp_xml.unlink()  # delete temporary xml file
 
-            if self.xml_forces:
-                temp_xml.unlink()  # delete temporary xml file
+            if time_range is not None:
+                return f"{results_dir}"
+            return (key, signature) if signature else None
 
-            if self.remove_empty_files:
-                self._remove_empty_files(directory=self.sto_output)
+    def _build_analysis(self, name, model, params):
+        """
+        Analysis initialized from the parameters of its node in the setup file
 
-            if self.contains:
-                self._subset_output(directory=self.sto_output, contains=self.contains)
+        Parameters
+        ----------
+        name : str
+            analysis (`StaticOptimization`, `MuscleAnalysis` or `JointReaction`)
+        model : osim.Model
+            model
+        params : dict
+            parameters of the analysis (see `parse_analyze_set_xml`)
+
+        Returns
+        -------
+        osim.Analysis
+        """
+        if name == "StaticOptimization":
+            analysis = osim.StaticOptimization(model)
+            analysis.setUseModelForceSet(params["use_model_force_set"])
+            analysis.setActivationExponent(params["activation_exponent"])
+            analysis.setUseMusclePhysiology(params["use_muscle_physiology"])
+            analysis.setConvergenceCriterion(
+                params["optimizer_convergence_criterion"]
+            )
+            analysis.setMaxIterations(int(params["optimizer_max_iterations"]))
+        elif name == "MuscleAnalysis":
+            analysis = osim.MuscleAnalysis(model)
+            coord = osim.ArrayStr()
+            for c in params["moment_arm_coordinate_list"]:
+                coord.append(c)
+            analysis.setCoordinates(coord)
+
+            mus = osim.ArrayStr()
+            for m in params["muscle_list"]:
+                mus.append(m)
+            analysis.setMuscles(mus)
+            # analysis.setComputeMoments(params["compute_moments"])
+        elif name == "JointReaction":
+            # construct joint reaction analysis
+            analysis = osim.JointReaction(model)
+            if params["forces_file"] or self.forces_file:
+                force_file = self.forces_file if self.forces_file else params["forces_file"]
+                analysis.setForcesFileName(force_file)
+
+            joint = osim.ArrayStr()
+            for j in params["joint_names"]:
+                joint.append(j)
+            analysis.setJointNames(joint)
+
+            body = osim.ArrayStr()
+            for b in params["apply_on_bodies"]:
+                body.append(b)
+            analysis.setOnBody(body)
+
+            frame = osim.ArrayStr()
+            for f in params["express_in_frame"]:
+                frame.append(f)
+            analysis.setInFrame(frame)
+        else:
+            raise ValueError(f"{name} is not an analysis supported by pyosim")
+        analysis.setModel(model)
+        analysis.setName(name)
+        analysis.setOn(params["on"])
+        analysis.setStepInterval(int(params["step_interval"]))
+        analysis.setInDegrees(params["in_degrees"])
+        return analysis
+
+    def load_model(self):
+        """
+        Initialized model, with the actuators of `xml_actuators` added.
+        When `model_input` is a path, the model read from file (with its actuators) is cached in the
+        current process, as long as the model and actuators files are not modified, and each trial
+        gets a fresh copy of it: the analyses, external loads and states of a trial never leak into
+        the next one.
+
+        Returns
+        -------
+        tuple
+            (osim.Model, True if the actuators are already added to the model)
+        """
+        if not isinstance(self.model_input, str):
+            self.model_input.initSystem()
+            return self.model_input, False
+
+        def build():
+            model = osim.Model(self.model_input)
+            if self.xml_actuators:
+                self._set_actuators(osim.AnalyzeTool(model), model)
+            return model
+
+        actuators_key = file_key(self.xml_actuators) if self.xml_actuators else None
+        pristine = cached(('AnalyzeToolModel', file_key(self.model_input), actuators_key), build)
+        model = pristine.clone()
+        model.initSystem()
+        return model, True
+
+    def _set_actuators(self, analyze_tool, model, update_model=True):
+        force_set = osim.ArrayStr()
+        force_set.append(self.xml_actuators)
+        analyze_tool.setForceSetFiles(force_set)
+        if update_model:
+            analyze_tool.updateModelForces(model, self.xml_actuators)
 
     def parse_analyze_set_xml(self, filename, node):
         from xml.etree import ElementTree
@@ -322,9 +661,10 @@ class AnalyzeTool:
         return li
 
     @staticmethod
-    def _remove_empty_files(directory, threshold=1000):
+    def _remove_empty_files(directory, threshold=1000, files=None):
         """
         Remove empty files from a directory.
+        Files removed in the meantime (by a concurrent run) are ignored.
 
         Parameters
         ----------
@@ -332,15 +672,33 @@ class AnalyzeTool:
             directory
         threshold : int
             threshold in bytes
+        files : list, optional
+            only consider these files of the directory (default: all)
+
+        Returns
+        -------
+        list
+            remaining files
         """
-        for ifile in Path(directory).iterdir():
-            if ifile.stat().st_size < threshold:
-                ifile.unlink()
+        kept = []
+        for ifile in Path(directory).iterdir() if files is None else files:
+            if ifile.name.startswith('.'):
+                # keep hidden files (manifest)
+                continue
+            try:
+                if ifile.stat().st_size < threshold:
+                    ifile.unlink()
+                else:
+                    kept.append(ifile)
+            except FileNotFoundError:
+                pass
+        return kept
 
     @staticmethod
-    def _subset_output(directory, contains):
+    def _subset_output(directory, contains, files=None):
         """
-        Keep only files that contains `contains` string
+        Keep only files that contains `contains` string.
+        Files removed in the meantime (by a concurrent run) are ignored.
 
         Parameters
         ----------
@@ -348,10 +706,18 @@ class AnalyzeTool:
             directory
         contains : str
             string
+        files : list, optional
+            only consider these files of the directory (default: all)
         """
-        for ifile in Path(directory).iterdir():
+        for ifile in Path(directory).iterdir() if files is None else files:
+            if ifile.name.startswith('.'):
+                # keep hidden files (manifest)
+                continue
             if contains not in ifile.stem:
-                ifile.unlink()
+                try:
+                    ifile.unlink()
+                except FileNotFoundError:
+                    pass
 
     @classmethod
     def get_class_name(cls):
@@ -1,15 +1,63 @@
 """
 Configuration class in pyosim
 """
+import copy
 import json
+import os
+from collections.abc import Mapping
+from contextlib import contextmanager
 from pathlib import Path
 
 import pandas as pd
 
 
+def dict_merge(dct, merge_dct):
+    """Recursive dict merge. Inspired by :meth:`dict.update()`, instead of
+    updating only top-level keys, dict_merge recurses down into dicts nested
+    to an arbitrary depth, updating keys. The `merge_dct` is merged into
+    `dct`.
+
+
+    Parameters
+    ----------
+    dct : dict
+        dict onto which the merge is executed
+    merge_dct : dict
+        dct merged into dct
+    """
+    for k, v in merge_dct.items():
+        if (k in dct and isinstance(dct[k], dict)
+                and isinstance(merge_dct[k], Mapping)):
+            dict_merge(dct[k], merge_dct[k])
+        else:
+            dct[k] = merge_dct[k]
+    return dct
+
+
+def write_json(filename, data):
+    """
+    Write a json file atomically (a temporary file is renamed over the destination)
+
+    Parameters
+    ----------
+    filename : str, Path
+        Path to the json file
+    data : dict
+        Content of the file
+    """
+    filename = Path(filename)
+    temp = filename.with_name(f'{filename.name}.{os.getpid()}.tmp')
+    with open(temp, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp, filename)
+
+
 class Conf:
     """
-    Configuration class in pyosim
+    Configuration class in pyosim.
+    Participants' configuration files are loaded once
+    and kept in memory (reloaded if modified on disk).
+    Updates can be buffered with `batch` and written in one go.
 
     Parameters
     ----------
@@ -17,6 +65,13 @@ class Conf:
         Path to the project
     conf_file : str
         Filename of the configuration file
+
+    Examples
+    --------
+    >>> conf = Conf(project_path=PROJECT_PATH)
+    >>> with conf.batch():  # files are written when leaving the block
+    >>>     for iparticipant in conf.get_participants_to_process():
+    >>>         conf.add_conf_field({iparticipant: {'model': 'wu'}})
     """
 
     def __init__(self, project_path, conf_file='_conf.csv'):
@@ -35,6 +90,19 @@ class Conf:
             self.project_conf = pd.read_csv(self.conf_path)
             print('Configuration file loaded')
 
+        self._index = {}
+        self._confs = {}  # conf path: (mtime_ns, data)
+        self._pending = {}  # conf path: list of updates to write
+        self._batch_level = 0
+        self._build_index()
+
+    def _build_index(self):
+        """Map each participant to its configuration file path (first row if duplicated)"""
+        self._index = {}
+        rows = zip(self.project_conf['participant'], self.project_conf['conf_file'])
+        for iparticipant, iconf in rows:
+            self._index.setdefault(iparticipant, iconf)
+
     def get_participants_to_process(self):
         """
         Get a list of participants with the flag 'process' to one or true in project configuration file
@@ -63,26 +131,90 @@ class Conf:
     def check_confs(self, verbose=False):
         """check if all participants have a configuration file and update it in the project's configuration file"""
 
-        for index, irow in self.project_conf.iterrows():
-            if not irow['process']:
-                continue
-            default = (self.project_path / irow['participant'] / '_conf.json')
-            is_nan = irow['conf_file'] != irow['conf_file']
-            if not is_nan and Path(irow['conf_file']).is_file():
-                if verbose:
-                    print(f'{irow["participant"]}: checked')
-            if (is_nan and default.is_file()) or default.is_file():  # check if nan or file exist in default location
-                conf_file = str(default.resolve())
-                self.project_conf.loc[index, 'conf_file'] = conf_file
-                self.update_conf(conf_file, {'conf_file': conf_file})
-                if verbose:
-                    print(f'{irow["participant"]}: updated in project conf')
-            else:
-                raise ValueError(f'{irow["participant"]} does not have a configuration file in {irow["conf_file"]}')
+        conf_files = self.project_conf['conf_file'].tolist()
+        rows = zip(self.project_conf['participant'], self.project_conf['process'], conf_files)
+        with self.batch():
+            for index, (participant, process, current) in enumerate(rows):
+                if not process:
+                    continue
+                default = (self.project_path / participant / '_conf.json')
+                is_nan = current != current
+                if not is_nan and Path(current).is_file():
+                    if verbose:
+                        print(f'{participant}: checked')
+                if default.is_file():  # check if nan or file exist in default location
+                    conf_file = str(default.resolve())
+                    conf_files[index] = conf_file
+                    self._update(conf_file, {'conf_file': conf_file})
+                    if verbose:
+                        print(f'{participant}: updated in project conf')
+                else:
+                    raise ValueError(
+                        f'{participant} does not have a configuration file in {current}'
+                    )
 
         # update conf file
+        self.project_conf['conf_file'] = conf_files
+        self._build_index()
         self.project_conf.to_csv(self.conf_path, index=False)
 
+    @contextmanager
+    def batch(self):
+        """
+        Context manager buffering the updates of configuration files. Each modified file is written
+        once, atomically, when leaving the outermost block.
+        """
+        self._batch_level += 1
+        try:
+            yield self
+        finally:
+            self._batch_level -= 1
+            if not self._batch_level:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered updates, merged with the current content of each file on disk"""
+        pending, self._pending = self._pending, {}
+        for conf_path, updates in pending.items():
+            data = self.get_conf_file(conf_path)
+            for iupdate in updates:
+                dict_merge(data, iupdate)
+            write_json(conf_path, data)
+            self._confs[conf_path] = (os.stat(conf_path).st_mtime_ns, data)
+
+    def _update(self, conf_path, d):
+        """Buffer an update and apply it to the cached configuration"""
+        conf_path = str(conf_path)
+        self._pending.setdefault(conf_path, []).append(copy.deepcopy(d))
+        if conf_path in self._confs:
+            dict_merge(self._confs[conf_path][1], copy.deepcopy(d))
+        if not self._batch_level:
+            self.flush()
+
+    def load_conf(self, participant):
+        """
+        Get participant's configuration from memory, the
+        file being read only if it changed since last access
+
+        Parameters
+        ----------
+        participant : str
+            Participant
+
+        Returns
+        -------
+        dict
+        """
+        conf_path = str(self.get_conf_path(participant))
+        mtime = os.stat(conf_path).st_mtime_ns
+        cached = self._confs.get(conf_path)
+        if cached is None or (cached[0] != mtime and conf_path not in self._pending):
+            data = self.get_conf_file(conf_path)
+            for iupdate in self._pending.get(conf_path, []):
+                dict_merge(data, copy.deepcopy(iupdate))
+            cached = self._confs[conf_path] = (mtime, data)
+        return cached[1]
+
     @classmethod
     def update_conf(cls, filename, d):
         """
@@ -94,37 +226,8 @@ class Conf:
         d : dict
             Dictionary to add in configuration file
         """
-
-        def dict_merge(dct, merge_dct):
-            """Recursive dict merge. Inspired by :meth:`dict.update()`, instead of
-            updating only top-level keys, dict_merge recurses down into dicts nested
-            to an arbitrary depth, updating keys. The `merge_dct` is merged into
-            `dct`.
-
-
-            Parameters
-            ----------
-            dct : dict
-                dict onto which the merge is executed
-            merge_dct : dict
-                dct merged into dct
-            """
-            from collections import Mapping
-            for k, v in merge_dct.items():
-                if (k in dct and isinstance(dct[k], dict)
-                        and isinstance(merge_dct[k], Mapping)):
-                    dict_merge(dct[k], merge_dct[k])
-                else:
-                    dct[k] = merge_dct[k]
-            return dct
-
-        file = open(filename, 'r')
-        data = json.load(file)
-
-        # data.update(d)
-        file = open(filename, 'w+')
-        json.dump(dict_merge(data, d), file)
-        file.close()
+        data = cls.get_conf_file(filename)
+        write_json(filename, dict_merge(data, d))
 
     @classmethod
     def get_conf_file(cls, filename):
@@ -146,7 +249,8 @@ class Conf:
 
     def add_conf_field(self, d):
         """
-        Update configurations files from a dictionary. The keys should be the participant's pseudo
+        Update configurations files from a dictionary. The keys should be the participant's pseudo.
+        Files are written once at the end (or when leaving the `batch` block)
 
         Parameters
         ----------
@@ -163,10 +267,10 @@ class Conf:
         }
         project.add_conf_field(d)
         """
-        for iparticipant, ivalue in d.items():
-            conf_file = self.get_conf_path(iparticipant)
-            self.update_conf(conf_file, ivalue)
-            print(f"{iparticipant}'s conf file updated")
+        with self.batch():
+            for iparticipant, ivalue in d.items():
+                self._update(self.get_conf_path(iparticipant), ivalue)
+                print(f"{iparticipant}'s conf file updated")
 
     def get_conf_path(self, participant):
         """
@@ -177,8 +281,7 @@ class Conf:
         participant : str
             Participant
         """
-        conf_path = self.project_conf[self.project_conf['participant'] == participant]['conf_file'].values[0]
-        return conf_path
+        return self._index[participant]
 
     def get_conf_field(self, participant, field):
         """
@@ -194,12 +297,8 @@ class Conf:
         -------
         str
         """
-        conf_path = self.get_conf_path(participant)
-        conf_file = self.get_conf_file(conf_path)
-
-        def get_from_dict(d, keys):
-            for k in keys:
-                d = d[k]
-            return d
-
-        return get_from_dict(conf_file, field)
+        value = self.load_conf(participant)
+        for k in field:
+            value = value[k]
+        # copy containers so that the cached configuration cannot be modified by the caller
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
@@ -0,0 +1,675 @@
+"""
+File input/output in pyosim.
+Text readers and writers for the OpenSim formats (`.trc`, `.sto`, `.mot`),
+without going through `osim.Storage`, `osim.MarkerData` or a `TimeSeriesTable`.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# number of frames read at once by the writers
+CHUNK_SIZE = 10000
+# maximum number of values formatted at once by the writers (bounds the temporary python objects)
+FORMAT_SIZE = 100000
+# width of the zero-padded row count reserved in the
+# header when the number of frames is not known in advance
+_COUNT_WIDTH = 10
+_COUNT_PLACEHOLDER = '{n_frames}'
+
+
+def _row_format(n_columns, precision, frame_column=False):
+    """
+    Format string of one data row
+
+    Parameters
+    ----------
+    n_columns : int
+        Number of data columns (time excluded)
+    precision : int
+        Number of significant digits
+    frame_column : bool, optional
+        Add a leading integer column (frame number in trc files, which also end rows with a tab)
+
+    Returns
+    -------
+    str
+    """
+    value = f'%.{precision}g'
+    row = ['%d'] if frame_column else []
+    row += [value] * (n_columns + 1)
+    return '\t'.join(row) + ('\t\n' if frame_column else '\n')
+
+
+def _format_block(block, row_format):
+    """
+    Format a 2d array (rows x columns) in a single string formatting operation
+
+    Parameters
+    ----------
+    block : np.ndarray
+        2d array to format
+    row_format : str
+        Format string of one row
+
+    Returns
+    -------
+    str
+    """
+    return (row_format * block.shape[0]) % tuple(block.ravel().tolist())
+
+
+def iter_blocks(data, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over an array (or a memory-mapped array) by blocks of frames (last dimension)
+
+    Parameters
+    ----------
+    data : np.ndarray
+        array with frames as last dimension
+    chunk_size : int, optional
+        number of frames per block
+
+    Yields
+    ------
+    np.ndarray
+    """
+    for start in range(0, data.shape[-1], chunk_size):
+        yield data[..., start:start + chunk_size]
+
+
+class _Writer:
+    """
+    Incremental text writer. The header is written on opening, data blocks are appended with
+    `write`. If the number of frames is not known in advance, a zero-padded row count is reserved
+    in the header and patched when the writer is closed.
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to write
+    rate : float, optional
+        data rate (Hz), used to compute the time vector of blocks written without time
+    n_frames : int, optional
+        number of frames (patched in the header on closing if not specified)
+    precision : int, optional
+        number of significant digits
+    """
+
+    frame_column = False
+
+    def __init__(self, filename, rate=None, n_frames=None, precision=16):
+        self.filename = Path(filename)
+        self.rate = rate
+        self.n_frames = n_frames
+        self.precision = precision
+        self.count = 0
+        self._row_format = _row_format(self.n_columns, precision, frame_column=self.frame_column)
+
+        header = self.header()
+        count = f'{n_frames}' if n_frames is not None else '0' * _COUNT_WIDTH
+        # byte offsets of the reserved row counts
+        self._offsets = []
+        position = header.find(_COUNT_PLACEHOLDER)
+        while position != -1:
+            if n_frames is None:
+                self._offsets.append(len(header[:position].encode()))
+            header = header.replace(_COUNT_PLACEHOLDER, count, 1)
+            position = header.find(_COUNT_PLACEHOLDER)
+
+        self.file = open(self.filename, 'w', newline='\n')
+        self.file.write(header)
+
+    @property
+    def n_columns(self):
+        raise NotImplementedError
+
+    def header(self):
+        """Header of the file, with `{n_frames}` where the number of frames should be written"""
+        raise NotImplementedError
+
+    def _to_rows(self, block):
+        """Convert a block of data to a (n_frames, n_columns) array"""
+        raise NotImplementedError
+
+    def write(self, block, time=None):
+        """
+        Append a block of frames to the file
+
+        Parameters
+        ----------
+        block : np.ndarray
+            data with frames as last dimension
+        time : np.ndarray, optional
+            time vector of the block (computed from `rate` if not specified)
+        """
+        rows = self._to_rows(np.asarray(block))
+        n = rows.shape[0]
+        if time is None:
+            if not self.rate:
+                raise ValueError('either `rate` or `time` should be specified')
+            time = (self.count + np.arange(n)) / self.rate
+
+        first = 2 if self.frame_column else 1
+        formatted = np.empty((n, rows.shape[1] + first))
+        if self.frame_column:
+            formatted[:, 0] = self.count + np.arange(1, n + 1)
+        formatted[:, first - 1] = time[:n]
+        formatted[:, first:] = rows
+
+        step = max(1, FORMAT_SIZE // formatted.shape[1])
+        for start in range(0, n, step):
+            self.file.write(_format_block(formatted[start:start + step], self._row_format))
+        self.count += n
+
+    def close(self):
+        """Close the file and patch the number of frames in the header"""
+        if self.file.closed:
+            return
+        self.file.close()
+        if self.n_frames is not None and self.n_frames != self.count:
+            raise ValueError(
+                f'{self.filename}: {self.n_frames} frames announced but {self.count} written'
+            )
+        if self._offsets:
+            if len(f'{self.count}') > _COUNT_WIDTH:
+                raise ValueError(
+                    f'{self.filename}: too many frames to patch the header ({self.count})'
+                )
+            with open(self.filename, 'r+b') as file:
+                for offset in self._offsets:
+                    file.seek(offset)
+                    file.write(f'{self.count:0{_COUNT_WIDTH}d}'.encode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TRCWriter(_Writer):
+    """
+    Incremental trc writer following the `osim.TRCFileAdapter` layout
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to write
+    labels : list
+        markers labels
+    rate : float
+        data rate (Hz)
+    unit : str
+        data unit (`mm` or `m`)
+    n_frames : int, optional
+        number of frames (patched in the header on closing if not specified)
+    precision : int, optional
+        number of significant digits
+    decimals : int, optional
+        round data to the given number of decimals before writing
+
+    Examples
+    --------
+    >>> with TRCWriter('markers.trc', labels=['M1', 'M2'], rate=200, unit='mm') as writer:
+    >>>     for block in blocks:  # blocks of shape (3, n_markers, n_frames)
+    >>>         writer.write(block)
+    """
+
+    frame_column = True
+
+    def __init__(self, filename, labels, rate, unit, n_frames=None, precision=16, decimals=None):
+        self.labels = list(labels)
+        self.unit = unit
+        self.decimals = decimals
+        super().__init__(filename, rate=rate, n_frames=n_frames, precision=precision)
+
+    @property
+    def n_columns(self):
+        return len(self.labels) * 3
+
+    def header(self):
+        n_markers = len(self.labels)
+        header = [
+            f'PathFileType\t4\t(X/Y/Z)\t{self.filename}',
+            'DataRate\tCameraRate\tNumFrames\tNumMarkers\tUnits\tOrigDataRate\tOrigDataStartFrame\t'
+            'OrigNumFrames',
+            f'{self.rate}\t{self.rate}\t{_COUNT_PLACEHOLDER}\t{n_markers}\t'
+            f'{self.unit}\t{self.rate}\t0\t{_COUNT_PLACEHOLDER}',
+            'Frame#\tTime\t' + ''.join(f'{label}\t\t\t' for label in self.labels),
+            '\t\t' + ''.join(f'X{i}\tY{i}\tZ{i}\t' for i in range(1, n_markers + 1)),
+            '',
+        ]
+        return '\n'.join(header) + '\n'
+
+    def _to_rows(self, block):
+        # (3, n_markers, n_frames) -> (n_frames, n_markers * 3) with x, y, z interleaved
+        block = block[:3, ...]
+        if self.decimals is not None:
+            block = np.round(block, decimals=self.decimals)
+        return np.transpose(block, (2, 1, 0)).reshape(block.shape[-1], -1)
+
+
+class STOWriter(_Writer):
+    """
+    Incremental sto writer following the `osim.STOFileAdapter` layout
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to write
+    labels : list
+        columns labels
+    rate : float, optional
+        data rate (Hz), used to compute the time vector of blocks written without time
+    metadata : dict, optional
+        metadata written in the header as `key=value` (`nRows` and `nColumns` are added if missing)
+    n_frames : int, optional
+        number of frames (patched in the header on closing if not specified)
+    precision : int, optional
+        number of significant digits (16 is what
+        `osim.STOFileAdapter` writes, lower it for smaller files)
+
+    Examples
+    --------
+    >>> with STOWriter('emg.sto', labels=['EMG1', 'EMG2'], rate=2000) as writer:
+    >>>     for block in blocks:  # blocks of shape (n_columns, n_frames)
+    >>>         writer.write(block)
+    """
+
+    def __init__(self, filename, labels, rate=None, metadata=None, n_frames=None, precision=16):
+        self.labels = list(labels)
+        self.metadata = dict(metadata) if metadata else {}
+        super().__init__(filename, rate=rate, n_frames=n_frames, precision=precision)
+
+    @property
+    def n_columns(self):
+        return len(self.labels)
+
+    def header(self):
+        metadata = dict(self.metadata)
+        metadata.setdefault('nColumns', self.n_columns)
+        metadata['nRows'] = _COUNT_PLACEHOLDER
+        # file adapter's own keys are written after the table metadata
+        adapter_keys = {
+            'DataType': metadata.pop('DataType', 'double'),
+            'version': metadata.pop('version', 3),
+        }
+        if 'OpenSimVersion' in metadata:
+            adapter_keys['OpenSimVersion'] = metadata.pop('OpenSimVersion')
+
+        header = [f'{key}={value}' for key, value in sorted(metadata.items())]
+        header += [f'{key}={value}' for key, value in adapter_keys.items()]
+        header += ['endheader', '\t'.join(['time'] + self.labels)]
+        return '\n'.join(header) + '\n'
+
+    def _to_rows(self, block):
+        return block.reshape(-1, block.shape[-1]).T
+
+
+def _write(writer, data, time, chunk_size):
+    """Write an array (by chunks) or an iterator of blocks with an opened writer"""
+    with writer:
+        if isinstance(data, np.ndarray):
+            starts = range(0, data.shape[-1], chunk_size)
+            for start, block in zip(starts, iter_blocks(data, chunk_size)):
+                writer.write(block, time=None if time is None else time[start:start + chunk_size])
+        else:
+            for block in data:
+                writer.write(block)
+
+
+def write_trc(filename, data, labels, rate, unit, time=None, precision=16, decimals=None,
+              chunk_size=CHUNK_SIZE):
+    """
+    Write a trc file from a (3, n_markers, n_frames)
+    array, a memory-mapped array or an iterator of blocks.
+    Frames are formatted by chunks, so that memory stays bounded whatever the recording length.
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to write
+    data : np.ndarray, iterable
+        markers data with shape (3, n_markers, n_frames) or iterable of such blocks
+    labels : list
+        markers labels
+    rate : float
+        data rate (Hz)
+    unit : str
+        data unit (`mm` or `m`)
+    time : np.ndarray, optional
+        time vector (computed from `rate` if not specified, ignored for iterators)
+    precision : int, optional
+        number of significant digits
+    decimals : int, optional
+        round data to the given number of decimals before writing
+    chunk_size : int, optional
+        number of frames read at once (formatted by blocks of at most `FORMAT_SIZE` values)
+    """
+    n_frames = data.shape[-1] if isinstance(data, np.ndarray) else None
+    writer = TRCWriter(
+        filename, labels, rate, unit, n_frames=n_frames, precision=precision, decimals=decimals
+    )
+    _write(writer, data, time, chunk_size)
+
+
+def write_sto(filename, data, labels, rate=None, time=None, metadata=None, precision=16,
+              chunk_size=CHUNK_SIZE):
+    """
+    Write a sto file from a (n_columns, n_frames) array,
+    a memory-mapped array or an iterator of blocks.
+    Frames are formatted by chunks, so that memory stays bounded whatever the recording length.
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to write
+    data : np.ndarray, iterable
+        data with shape (n_columns, n_frames) or iterable of such blocks
+    labels : list
+        columns labels
+    rate : float, optional
+        data rate (Hz), used to compute the time vector if `time` is not specified
+    time : np.ndarray, optional
+        time vector (ignored for iterators)
+    metadata : dict, optional
+        metadata written in the header as `key=value` (`nRows` and `nColumns` are added if missing)
+    precision : int, optional
+        number of significant digits (16 is what
+        `osim.STOFileAdapter` writes, lower it for smaller files)
+    chunk_size : int, optional
+        number of frames read at once (formatted by blocks of at most `FORMAT_SIZE` values)
+    """
+    if time is None and not rate:
+        raise ValueError('either `rate` or `time` should be specified')
+    n_frames = data.shape[-1] if isinstance(data, np.ndarray) else None
+    writer = STOWriter(
+        filename, labels, rate=rate, metadata=metadata, n_frames=n_frames, precision=precision
+    )
+    _write(writer, data, time, chunk_size)
+
+
+def trial_filename(template, trial, unique=False):
+    """
+    Output filename of a trial
+
+    Parameters
+    ----------
+    template : str, Path, None
+        output path, where `{trial}` is replaced by the trial name
+    trial : str
+        trial name
+    unique : bool, optional
+        append the trial name to the filename if the template does not contain `{trial}` (used in
+        multiprocessing, so that workers never write the same file)
+
+    Returns
+    -------
+    str or None
+        None if `template` is None
+    """
+    if template is None:
+        return None
+    template = str(template)
+    if '{trial}' in template:
+        return template.replace('{trial}', trial)
+    if unique:
+        filename = Path(template)
+        return str(filename.with_name(f'{filename.stem}_{trial}{filename.suffix}'))
+    return template
+
+
+def _last_line(file, block_size=65536):
+    """Last non-empty line of a file opened in binary mode, read from the end of the file"""
+    file.seek(0, os.SEEK_END)
+    end = file.tell()
+    tail = b''
+    while end > 0:
+        start = max(0, end - block_size)
+        file.seek(start)
+        tail = file.read(end - start) + tail
+        end = start
+        lines = tail.strip().splitlines()
+        if len(lines) > 1 or (lines and start == 0):
+            return lines[-1].decode()
+    return ''
+
+
+def read_header(filename):
+    """
+    Read the header of a trc, sto or mot file without reading the data body.
+    Only the first data lines and the last line of the file are read to get the time range.
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to read
+
+    Returns
+    -------
+    dict
+        `labels` (list), `rate` (float), `first_time` (float), `last_time` (float), `n_frames`
+        (int), `metadata` (dict) and `skiprows` (number of lines before the first data line)
+    """
+    filename = Path(filename)
+    is_trc = filename.suffix.lower() == '.trc'
+    metadata = {}
+    with open(filename, 'rb') as file:
+        lines = []
+        if is_trc:
+            for _ in range(5):
+                lines.append(file.readline().decode().rstrip('\r\n'))
+            metadata = dict(zip(lines[1].split('\t'), lines[2].split('\t')))
+            labels = [label for label in lines[3].split('\t')[2:] if label.strip()]
+            time_column = 1
+        else:
+            line = file.readline().decode()
+            while line and line.strip().lower() != 'endheader':
+                lines.append(line.rstrip('\r\n'))
+                if '=' in line:
+                    key, value = line.strip().split('=', 1)
+                    metadata[key] = value
+                line = file.readline().decode()
+            if not line:
+                raise ValueError(f'{filename}: `endheader` not found')
+            lines.append(line.rstrip('\r\n'))
+            labels_line = file.readline().decode()
+            lines.append(labels_line.rstrip('\r\n'))
+            labels = labels_line.split()[1:]
+            time_column = 0
+
+        # first two data lines (skipping blank lines)
+        data_lines = []
+        while len(data_lines) < 2:
+            line = file.readline()
+            if not line:
+                break
+            if line.strip():
+                data_lines.append(line.split())
+            elif not data_lines:
+                lines.append('')
+        last = _last_line(file).split()
+
+    times = [float(line[time_column]) for line in data_lines]
+    first_time = times[0] if times else None
+    last_time = float(last[time_column]) if data_lines else None
+
+    if is_trc and 'DataRate' in metadata:
+        rate = float(metadata['DataRate'])
+    elif len(times) > 1 and times[1] != times[0]:
+        rate = 1 / (times[1] - times[0])
+    else:
+        rate = None
+
+    n_frames = metadata.get('NumFrames', metadata.get('nRows'))
+    if n_frames is not None:
+        n_frames = int(n_frames)
+    elif rate and data_lines:
+        n_frames = int(round((last_time - first_time) * rate)) + 1
+    else:
+        n_frames = len(data_lines)
+
+    return {
+        'labels': labels,
+        'rate': rate,
+        'first_time': first_time,
+        'last_time': last_time,
+        'n_frames': n_frames,
+        'metadata': metadata,
+        'skiprows': len(lines),
+    }
+
+
+def read_time_range(filename):
+    """
+    First and last time of a trc, sto or mot file, read without parsing the data body
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to read
+
+    Returns
+    -------
+    tuple
+        (first time, last time)
+    """
+    header = read_header(filename)
+    return header['first_time'], header['last_time']
+
+
+def read_sto(filename, header_only=False):
+    """
+    Read a sto or mot file into a pandas DataFrame indexed by time
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to read
+    header_only : bool, optional
+        return the header (see `read_header`) without reading the data body
+
+    Returns
+    -------
+    pd.DataFrame or dict
+    """
+    header = read_header(filename)
+    if header_only:
+        return header
+    data = pd.read_csv(
+        filename, sep=r'\s+', header=None, skiprows=header['skiprows'], dtype=float,
+        float_precision='round_trip'
+    )
+    data.columns = ['time'] + header['labels']
+    return data.set_index('time')
+
+
+def read_trc(filename, header_only=False):
+    """
+    Read a trc file into a pandas DataFrame indexed by time, with (marker, axis) columns
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file to read
+    header_only : bool, optional
+        return the header (see `read_header`) without reading the data body
+
+    Returns
+    -------
+    pd.DataFrame or dict
+    """
+    header = read_header(filename)
+    if header_only:
+        return header
+    n_columns = len(header['labels']) * 3
+    data = pd.read_csv(
+        filename, sep='\t', header=None, skiprows=header['skiprows'],
+        usecols=range(1, n_columns + 2), dtype=float, float_precision='round_trip'
+    )
+    data = data.set_index(1)
+    data.index.name = 'time'
+    data.columns = pd.MultiIndex.from_product(
+        [header['labels'], ['x', 'y', 'z']], names=['marker', 'axis']
+    )
+    return data
+
+
+def time_windows(start, end, n_windows, overlap=0.0):
+    """
+    Split a time range into windows extended by an overlap on each side, so that each window can be
+    processed independently and the transients at its edges (filters, solver initialization)
+    discarded
+
+    Parameters
+    ----------
+    start : float
+        first time
+    end : float
+        last time
+    n_windows : int
+        number of windows
+    overlap : float, optional
+        duration (s) added before and after each window (clipped to the time range)
+
+    Returns
+    -------
+    list
+        (run start, run end, keep start, keep end) of each window
+    """
+    start, end = float(start), float(end)
+    bounds = np.linspace(start, end, n_windows + 1).tolist()
+    return [
+        (max(start, ikeep_start - overlap), min(end, ikeep_end + overlap), ikeep_start, ikeep_end)
+        for ikeep_start, ikeep_end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def stitch(files, output, keeps, tolerance=1e-9):
+    """
+    Concatenate the sto or mot files of the windows of a trial (see `time_windows`), keeping the
+    rows of each window in its keep range. The header of the first file is used, with the number of
+    rows updated.
+    Rows are copied as text, without being parsed again.
+
+    Parameters
+    ----------
+    files : list
+        files of the windows, in time order
+    output : str, Path
+        stitched file
+    keeps : list
+        (keep start, keep end) of each window. The keep end is excluded, except for the last window
+    tolerance : float, optional
+        tolerance on the times
+    """
+    header, rows = [], []
+    for i, (ifile, (keep_start, keep_end)) in enumerate(zip(files, keeps)):
+        last = i == len(files) - 1
+        with open(ifile) as file:
+            line = file.readline()
+            while line and line.strip().lower() != 'endheader':
+                if not i:
+                    header.append(line)
+                line = file.readline()
+            if not line:
+                raise ValueError(f'{ifile}: `endheader` not found')
+            labels = file.readline()
+            if not i:
+                header += [line, labels]
+            for line in file:
+                if not line.strip():
+                    continue
+                time = float(line.split(None, 1)[0])
+                if time < keep_start - tolerance:
+                    continue
+                if time > keep_end + tolerance or (time > keep_end - tolerance and not last):
+                    break
+                rows.append(line if line.endswith('\n') else f'{line}\n')
+
+    header = [f'nRows={len(rows)}\n' if iline.startswith('nRows=') else iline for iline in header]
+    with open(output, 'w') as file:
+        file.writelines(header)
+        file.writelines(rows)
@@ -0,0 +1,258 @@
+"""
+File index in pyosim
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from pyosim.project import PARTICIPANT_DIRS
+
+INDEX_NAME = '.pyosim_index.json'
+
+# timestamp granularity of the coarsest filesystems (FAT, some NFS and SMB servers): a directory
+# listed less than this after its mtime may change again without its mtime changing
+MTIME_GRANULARITY_NS = 2 * 10 ** 9
+
+
+def is_trial_file(filename, trial):
+    """
+    True if the stem of `filename` is the trial name, or the trial name with a prefix and/or a
+    suffix (`wu_trial1.mot`, `trial1_StaticOptimization_force.sto` and
+    `wu_trial1_StaticOptimization_force.sto` are files of `trial1`)
+
+    Parameters
+    ----------
+    filename : str, Path
+        file name
+    trial : str
+        trial name
+
+    Returns
+    -------
+    bool
+    """
+    stem = Path(filename).stem
+    if stem == trial or stem.startswith(f'{trial}_') or stem.endswith(f'_{trial}'):
+        return True
+    return f'_{trial}_' in stem
+
+
+class FileIndex:
+    """
+    Persisted index of the files of a project:
+    participant/stage directory -> file name -> size and mtime.
+    A directory is listed again only if its mtime changed (a file was added, renamed or removed), so
+    refreshing an up-to-date index costs one `stat` per directory instead of one listing. A listing
+    made within `MTIME_GRANULARITY_NS` of the directory mtime is not trusted (a file added in the
+    same timestamp tick would not change the mtime) and the directory is listed again next time.
+    Files overwritten in place do not change the directory mtime: tools writing files can `record`
+    them, `refresh(stat_files=True)` stats every indexed file.
+
+    Parameters
+    ----------
+    project_path : str, Path
+        Path to the project
+    filename : str, Path, optional
+        Path to the index file (default: `.pyosim_index.json` in the project directory)
+
+    Examples
+    --------
+    >>> from pyosim import FileIndex
+    >>>
+    >>> index = FileIndex(PROJECT_PATH)
+    >>> index.refresh()
+    >>> trc_files = index.files('dapo', '0_markers', suffix='.trc')
+    >>> mot_files = index.files('dapo', '1_inverse_kinematic', suffix='.mot')
+    >>> index.save()
+    """
+
+    def __init__(self, project_path, filename=None):
+        self.project_path = Path(project_path).resolve()
+        self.path = Path(filename) if filename else self.project_path / INDEX_NAME
+        # relative directory: {'mtime_ns': int, 'listed_ns': int, 'files': {name: [size, mtime_ns]}}
+        self.directories = {}
+        if self.path.is_file():
+            try:
+                with open(self.path) as file:
+                    self.directories = json.load(file)['directories']
+            except (ValueError, KeyError):  # corrupted index, rebuilt from scratch
+                self.directories = {}
+
+    def _key(self, directory):
+        directory = Path(directory)
+        if directory.is_absolute():
+            directory = directory.resolve().relative_to(self.project_path)
+        return directory.as_posix()
+
+    def listdir(self, directory, stat_files=False):
+        """
+        Files of a directory of the project, listed only if the directory changed since it was
+        indexed or if it was indexed within `MTIME_GRANULARITY_NS` of its last change
+
+        Parameters
+        ----------
+        directory : str, Path
+            directory (absolute or relative to the project)
+        stat_files : bool, optional
+            stat the indexed files even if the directory did not change
+
+        Returns
+        -------
+        dict
+            {name: [size, mtime_ns]}
+        """
+        key = self._key(directory)
+        path = self.project_path / key
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.directories.pop(key, None)
+            return {}
+
+        entry = self.directories.get(key)
+        changed = entry is None or entry['mtime_ns'] != mtime
+        if changed or entry.get('listed_ns', 0) < mtime + MTIME_GRANULARITY_NS:
+            listed = time.time_ns()
+            files = {}
+            with os.scandir(path) as it:
+                for ientry in it:
+                    if ientry.name.startswith('.') or not ientry.is_file():
+                        continue
+                    try:
+                        stat = ientry.stat()
+                    except FileNotFoundError:  # removed in the meantime
+                        continue
+                    files[ientry.name] = [stat.st_size, stat.st_mtime_ns]
+            entry = {'mtime_ns': mtime, 'listed_ns': listed, 'files': files}
+            self.directories[key] = entry
+        elif stat_files:
+            for iname in list(entry['files']):
+                self.record(path / iname)
+        return entry['files']
+
+    def participants(self):
+        """
+        Participants directories of the project (directories not starting with `_` or `.`)
+
+        Returns
+        -------
+        list
+        """
+        with os.scandir(self.project_path) as it:
+            return sorted(
+                ientry.name for ientry in it
+                if ientry.is_dir() and not ientry.name.startswith(('_', '.'))
+            )
+
+    def refresh(self, participants=None, stages=None, stat_files=False):
+        """
+        Update the index
+
+        Parameters
+        ----------
+        participants : list, optional
+            participants to refresh (default: all the participants directories)
+        stages : list, optional
+            stages directories to refresh (default: `pyosim.project.PARTICIPANT_DIRS`)
+        stat_files : bool, optional
+            stat the indexed files even if their directory did not change
+        """
+        for iparticipant in participants or self.participants():
+            for istage in stages or PARTICIPANT_DIRS:
+                self.listdir(f'{iparticipant}/{istage}', stat_files=stat_files)
+
+    def files(self, participant, stage, suffix=None, trial=None):
+        """
+        Files of a participant's stage directory
+
+        Parameters
+        ----------
+        participant : str
+            participant
+        stage : str
+            stage directory (`0_markers`, `1_inverse_kinematic`...)
+        suffix : str, optional
+            only the files with this suffix (`.trc`, `.mot`...)
+        trial : str, optional
+            only the files of this trial (see `is_trial_file`)
+
+        Returns
+        -------
+        list
+            sorted paths
+        """
+        directory = self.project_path / participant / stage
+        names = self.listdir(f'{participant}/{stage}')
+        return [
+            directory / iname for iname in sorted(names)
+            if (suffix is None or iname.endswith(suffix)) and (
+                trial is None or is_trial_file(iname, trial)
+            )
+        ]
+
+    def trials(self, participant, stage='0_markers', suffix='.trc'):
+        """
+        Trials names of a participant (stems of the files of a stage directory)
+
+        Parameters
+        ----------
+        participant : str
+            participant
+        stage : str, optional
+            stage directory
+        suffix : str, optional
+            suffix of the trial files
+
+        Returns
+        -------
+        list
+        """
+        return [ifile.stem for ifile in self.files(participant, stage, suffix=suffix)]
+
+    def record(self, *filenames):
+        """
+        Update the index entry of written (or removed) files
+
+        Parameters
+        ----------
+        filenames : str, Path
+            files of the project
+        """
+        for ifile in filenames:
+            ifile = Path(ifile)
+            key = self._key(ifile.parent)
+            entry = self.directories.get(key)
+            if entry is None:
+                continue  # directory not indexed yet, listed on next access
+            try:
+                stat = os.stat(ifile)
+            except FileNotFoundError:
+                entry['files'].pop(ifile.name, None)
+            else:
+                entry['files'][ifile.name] = [stat.st_size, stat.st_mtime_ns]
+
+    def table(self):
+        """
+        Index as a table
+
+        Returns
+        -------
+        pandas DataFrame
+            directory, file, size and mtime_ns columns
+        """
+        rows = [
+            [idirectory, iname, size, mtime]
+            for idirectory, ientry in self.directories.items()
+            for iname, (size, mtime) in ientry['files'].items()
+        ]
+        return pd.DataFrame(rows, columns=['directory', 'file', 'size', 'mtime_ns'])
+
+    def save(self):
+        """Write the index atomically"""
+        temp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(temp, 'w') as file:
+            json.dump({'directories': self.directories}, file)
+        os.replace(temp, self.path)
@@ -0,0 +1,167 @@
+"""
+Instrumentation in pyosim.
+Tools emit one event per phase of a trial (model loading, file parsing, solver, cleanup...) to a
+sink, a callable receiving the event as a dict. Without sink, phases are not measured.
+
+Examples
+--------
+>>> from pyosim import JSONLinesSink, set_sink
+>>>
+>>> # for all tools, set before the first multiprocessing run
+>>> set_sink(JSONLinesSink('events.jsonl'))
+>>> # or for one tool: InverseKinematics(..., instrument=JSONLinesSink('events.jsonl'))
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+_sink = None
+
+
+def set_sink(sink):
+    """
+    Set the default sink of the tools (used when a tool is created without `instrument`).
+    Worker processes of a pool inherit the sink that was set when the pool was created.
+
+    Parameters
+    ----------
+    sink : callable, None
+        function receiving the events (dict), None to disable instrumentation
+    """
+    global _sink
+    _sink = sink
+
+
+def get_sink():
+    """Default sink of the tools"""
+    return _sink
+
+
+def peak_rss():
+    """
+    Peak resident set size of the current process since it started (it never decreases)
+
+    Returns
+    -------
+    int or None
+        bytes (None if not available on the platform)
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class _NoMeasure:
+    """Context manager doing nothing, used when there is no sink"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_MEASURE = _NoMeasure()
+
+
+class _Measure:
+    def __init__(self, sink, stage, trial, phase):
+        self.sink = sink
+        self.event = {'stage': stage, 'trial': trial, 'phase': phase}
+
+    def __enter__(self):
+        self.rss = peak_rss()
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self.wall
+        cpu_time = time.process_time() - self.cpu
+        rss = peak_rss()
+        self.event.update(
+            wall_time=wall_time,
+            cpu_time=cpu_time,
+            process_peak_rss=rss,
+            peak_rss_delta=None if rss is None else rss - self.rss,
+            status='error' if exc_type else 'ok',
+            pid=os.getpid(),
+            timestamp=time.time(),
+        )
+        self.sink(self.event)
+        return False
+
+
+def measure(stage, trial, phase, sink=None):
+    """
+    Context manager emitting an event with the wall time, CPU time and peak RSS of a phase
+    (`process_peak_rss`: peak of the process since it started, `peak_rss_delta`: growth of this
+    peak during the phase)
+
+    Parameters
+    ----------
+    stage : str
+        stage (typically the tool class name)
+    trial : str
+        trial name
+    phase : str
+        phase of the stage (`load_model`, `read_header`, `solve`, `cleanup`...)
+    sink : callable, optional
+        function receiving the event (default: sink set with `set_sink`)
+
+    Examples
+    --------
+    >>> with measure('InverseKinematics', 'trial1', 'solve'):
+    >>>     ik_tool.run()
+    """
+    sink = sink or _sink
+    if sink is None:
+        return _NO_MEASURE
+    return _Measure(sink, stage, trial, phase)
+
+
+class JSONLinesSink:
+    """
+    Sink appending events to a JSON lines file. Each event is written with a single call, so that
+    processes can share the same file.
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+
+    def __call__(self, event):
+        with open(self.filename, 'a') as file:
+            file.write(json.dumps(event) + '\n')
+
+
+class LoggingSink:
+    """
+    Sink sending events to a logger
+
+    Parameters
+    ----------
+    name : str, optional
+        logger name
+    level : int, optional
+        logging level
+    """
+
+    def __init__(self, name='pyosim', level=logging.INFO):
+        self.name = name
+        self.level = level
+
+    def __call__(self, event):
+        logging.getLogger(self.name).log(self.level, json.dumps(event))
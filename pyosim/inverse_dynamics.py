@@ -5,8 +5,13 @@ from pathlib import Path
 
 import opensim as osim
 
+from pyosim.fileio import read_header, read_time_range, trial_filename
+from pyosim.instrumentation import measure
+from pyosim.manifest import Manifest, inputs_signature
+from pyosim.parallel import ParallelTool, dispatch, run_windows, scratch_file, scratch_folder
 
-class InverseDynamics:
+
+class InverseDynamics(ParallelTool):
     """
     Inverse dynamic in pyosim
 
@@ -16,26 +21,49 @@ class InverseDynamics:
         Path to the osim model
     xml_input : str
         Path to the generic id xml
-    xml_output : str
-        Output path of the id xml
+    xml_output : str, None
+        Output path of the id xml (`{trial}` is replaced by the trial name, not written if None).
+        In multiprocessing, the trial name is appended
+        to the filename if it does not contain `{trial}`
     xml_forces : str
         Path to the generic forces sensor xml
     forces_dir : str
         Path of the directory containing the forces files (`.sto`)
-    mot_files : str, Path, list
-        Path or list of path to the directory containing the motion files (`.mot`)
+    mot_files : str, Path, list, None
+        Path or list of path to the directory containing the motion files (`.mot`).
+        If None, the trials are the keys of `coordinates`
     sto_output : Path, str
         Output directory
     prefix : str, optional
         Optional prefix to put in front of the output filename (typically model name)
     low_pass : int, optional
         Cutoff frequency for an optional low pass filter on coordinates
+    incremental : bool, optional
+        Skip trials whose inputs (model, setup files, motion and forces files) did not change since
+        their output was produced, according to the manifest stored in `sto_output`
+    instrument : callable, optional
+        Sink receiving the timing and memory events of each phase (default: `pyosim.set_sink`)
+    coordinates : dict, optional
+        Coordinates of the trials already in memory, as `osim.Storage` with the motion file stem as
+        key (typically `InverseKinematics(..., keep_kinematics=True).kinematics`).
+        These trials do not read their motion file and are not tracked by the manifest. Cannot be
+        used with `multi` nor `forces_dir`
+    shards : int, optional
+        Split each trial into this number of time windows stitched in one file (see
+        `pyosim.parallel.run_windows`). The setup of the whole trial is written to `xml_output`
+    overlap : float, optional
+        Duration (s) added on each side of the windows
+    cost_model : CostModel, optional
+        Cost model of the stage used with `multi` (see `pyosim.parallel.dispatch`)
+    index : FileIndex, optional
+        Index of the project containing `sto_output`, whose entry of `sto_output` is refreshed once
+        the trials are processed
     multi : bool, optional
         Launch InverseDynamics in multiprocessing if True
 
     Examples
     --------
-    >>> from pyosim import Conf
+    >>> from pyosim import Conf, FileIndex
     >>> from pyosim import InverseDynamics
     >>> from pathlib import Path
     >>>
@@ -45,7 +73,8 @@ class InverseDynamics:
     >>> participant = 'dapo'
     >>> model = 'wu'
     >>>
-    >>> trials = [ifile for ifile in (PROJECT_PATH / participant / '1_inverse_kinematic').glob('*.mot')]
+    >>> index = FileIndex(PROJECT_PATH)
+    >>> trials = index.files(participant, '1_inverse_kinematic', suffix='.mot')
     >>> conf = Conf(project_path=PROJECT_PATH)
     >>> onsets = conf.get_conf_field(participant, ['onset'])
     >>>
@@ -58,7 +87,8 @@ class InverseDynamics:
     >>>     mot_files=trials,
     >>>     sto_output=f"{(PROJECT_PATH / participant / '2_inverse_dynamic').resolve()}",
     >>>     prefix=model,
-    >>>     low_pass=10
+    >>>     low_pass=10,
+    >>>     index=index
     >>> )
     """
 
@@ -74,6 +104,13 @@ class InverseDynamics:
             forces_dir=None,
             prefix=None,
             low_pass=None,
+            incremental=False,
+            instrument=None,
+            coordinates=None,
+            shards=None,
+            overlap=0.5,
+            cost_model=None,
+            index=None,
             multi=False
     ):
         self.model_input = model_input
@@ -86,7 +123,25 @@ class InverseDynamics:
         self.low_pass = low_pass
         self.multi = multi
         self.prefix = prefix
+        self.instrument = instrument
+        self.manifest = Manifest(sto_output) if incremental else None
+        self.coordinates = coordinates or {}
+        self.shards = shards
+        self.overlap = overlap
+        self.cost_model = cost_model
+        self.index = index
+
+        if self.coordinates and multi:
+            raise ValueError(
+                'coordinates in memory cannot be sent to worker processes, use multi=False'
+            )
+        if self.coordinates and forces_dir:
+            raise ValueError(
+                'external loads require the motion files, use mot_files instead of coordinates'
+            )
 
+        if mot_files is None:
+            mot_files = list(self.coordinates)
         if not isinstance(mot_files, list):
             self.mot_files = [mot_files]
         else:
@@ -98,67 +153,251 @@ class InverseDynamics:
         self.main_loop()
 
     def main_loop(self):
-        if self.multi:
-            import os
-            from multiprocessing import Pool
-
-            pool = Pool(os.cpu_count())
-            pool.map(self.run_id_tool, self.mot_files)
+        if self.shards:
+            results = self.run_sharded()
+            if self.manifest:
+                self.manifest.record(results)
+        elif self.multi:
+            n_frames = [read_header(itrial)['n_frames'] for itrial in self.mot_files]
+            results = dispatch(
+                self.__class__.__name__, self.run_id_tool, self.mot_files, n_frames,
+                cost_model=self.cost_model
+            )
+            if self.manifest:
+                self.manifest.record(results)
         else:
             for itrial in self.mot_files:
-                self.run_id_tool(itrial)
+                result = self.run_id_tool(itrial)
+                if self.manifest:
+                    self.manifest.record([result])
 
-    def run_id_tool(self, trial):
-        if self.prefix and not trial.stem.startswith(self.prefix):
-            # skip file if user specified a prefix and prefix is not present in current file
-            pass
-        else:
-            print(f'\t{trial.stem}')
+        if self.index is not None:
+            self.index.listdir(Path(self.sto_output).resolve(), stat_files=True)
+
+    def forces_file(self, trial):
+        """
+        External forces file (`.sto`) of a trial
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+
+        Returns
+        -------
+        str
+        """
+        stem = trial.stem.replace(f'{self.prefix}_', '') if self.prefix else trial.stem
+        return f"{Path(self.forces_dir, stem).resolve()}.sto"
+
+    def trial_signature(self, trial):
+        """
+        Signature of the inputs of a trial, None if it cannot be computed (model given as an
+        `osim.Model`)
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+
+        Returns
+        -------
+        dict or None
+        """
+        if not isinstance(self.model_input, str):
+            return None
+        inputs = [self.model_input, self.xml_input, trial]
+        if self.forces_dir:
+            inputs += [self.xml_forces, self.forces_file(trial)]
+        return inputs_signature(inputs, params={'low_pass': self.low_pass})
+
+    def output_name(self, trial):
+        """Name of the output file of a trial (without extension)"""
+        return self.sto_file_output if self.sto_file_output else trial.stem
+
+    def time_range(self, trial):
+        """
+        First and last time of a trial, from the coordinates in memory or from the motion file
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+
+        Returns
+        -------
+        tuple
+        """
+        coordinates = self.coordinates.get(trial.stem)
+        if coordinates is not None:
+            return coordinates.getFirstTime(), coordinates.getLastTime()
+        with measure(self.__class__.__name__, trial.stem, 'read_header', self.instrument):
+            return read_time_range(trial)
+
+    def run_sharded(self):
+        """
+        Run each trial as `shards` overlapping time windows (in parallel with `multi`) and stitch
+        their results
 
-            # initialize inverse dynamic tool from setup file
-            model = osim.Model(self.model_input) if isinstance(self.model_input, str) else self.model_input
+        Returns
+        -------
+        list
+            manifest entry (or None) of each trial
+        """
+        results, trials = [], []
+        for itrial in self.mot_files:
+            if self.prefix and not itrial.stem.startswith(self.prefix):
+                # skip file if user specified a prefix and prefix is not present in current file
+                continue
+            output = Path(self.sto_output, f'{self.output_name(itrial)}.sto')
+            signature = None
+            if self.manifest and itrial.stem not in self.coordinates:
+                signature = self.trial_signature(itrial)
+            if signature and self.manifest.is_up_to_date(itrial.stem, signature, [output]):
+                print(f'\t{itrial.stem} (up to date)')
+                continue
+            trials.append((itrial, self.time_range(itrial), signature))
+
+        # each window writes the output file in its own directory
+        run_windows(
+            self.__class__.__name__, self.run_id_tool,
+            [(itrial, time_range, self.sto_output) for itrial, time_range, _ in trials],
+            self.shards, self.overlap, multi=self.multi, instrument=self.instrument
+        )
+
+        for itrial, time_range, signature in trials:
+            # setup of the whole trial, as written by unsharded runs
+            xml_output = trial_filename(self.xml_output, itrial.stem, unique=self.multi)
+            if xml_output:
+                with measure(self.__class__.__name__, itrial.stem, 'write_setup', self.instrument):
+                    model, id_tool, temp_xml = self.setup_tool(itrial, self.sto_output, time_range)
+                    id_tool.printToXML(xml_output)
+                    if temp_xml:
+                        temp_xml.unlink()
+            results.append((itrial.stem, signature) if signature else None)
+        return results
+
+    def setup_tool(self, trial, results_dir, time_range):
+        """
+        Inverse dynamics tool set up for a trial. The external loads are written in a temporary xml
+        file, to be removed once the tool has run
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+        results_dir : str, Path
+            output directory
+        time_range : tuple
+            start and end times
+
+        Returns
+        -------
+        tuple
+            (osim.Model, osim.InverseDynamicsTool, temporary xml file or None)
+        """
+        output_name = self.output_name(trial)
+        coordinates = self.coordinates.get(trial.stem)
+        stage = self.__class__.__name__
+
+        # initialize inverse dynamic tool from setup file
+        with measure(stage, trial.stem, 'load_model', self.instrument):
+            model = self.model_input
+            if isinstance(model, str):
+                model = osim.Model(model)
             id_tool = osim.InverseDynamicsTool(self.xml_input)
             id_tool.setModel(model)
 
-            # get starting and ending time
-            motion = osim.Storage(f'{trial.resolve()}')
-            start = motion.getFirstTime()
-            end = motion.getLastTime()
-
-            # inverse dynamics tool
-            id_tool.setStartTime(start)
-            id_tool.setEndTime(end)
+        # inverse dynamics tool
+        id_tool.setStartTime(time_range[0])
+        id_tool.setEndTime(time_range[1])
+        if coordinates is None:
             id_tool.setCoordinatesFileName(f'{trial.resolve()}')
+        else:
+            # the tool filters its own copy of the storage
+            id_tool.setCoordinateValues(coordinates)
 
-            if self.low_pass:
-                id_tool.setLowpassCutoffFrequency(self.low_pass)
+        if self.low_pass:
+            id_tool.setLowpassCutoffFrequency(self.low_pass)
 
-            # set name of input (mot) file and output (sto)
-            filename = f'{trial.stem}'
-            id_tool.setName(filename)
-            filename = self.sto_file_output if self.sto_file_output else filename
-            id_tool.setOutputGenForceFileName(f"{filename}.sto")
-            id_tool.setResultsDir(f'{self.sto_output}')
+        # set name of input (mot) file and output (sto)
+        id_tool.setName(f'{trial.stem}')
+        id_tool.setOutputGenForceFileName(f"{output_name}.sto")
+        id_tool.setResultsDir(f'{results_dir}')
 
-            # external loads file
-            if self.forces_dir:
+        # external loads file
+        temp_xml = None
+        if self.forces_dir:
+            with measure(stage, trial.stem, 'external_loads', self.instrument):
                 loads = osim.ExternalLoads(self.xml_forces, True)
-                if self.prefix:
-                    loads.setDataFileName(
-                        f"{Path(self.forces_dir, trial.stem.replace(f'{self.prefix}_', '')).resolve()}.sto"
-                    )
-                else:
-                    loads.setDataFileName(
-                        f"{Path(self.forces_dir, trial.stem).resolve()}.sto"
-                    )
+                loads.setDataFileName(self.forces_file(trial))
                 loads.setExternalLoadsModelKinematicsFileName(f'{trial.resolve()}')
 
-                temp_xml = Path(f'{trial.stem}_temp.xml')
-                loads.printToXML(f'{temp_xml.resolve()}')  # temporary xml file
+                temp_xml = scratch_file(f'{trial.stem}_external_loads')
+                loads.printToXML(f'{temp_xml}')  # temporary xml file
                 id_tool.setExternalLoadsFileName(f'{temp_xml}')
 
-            id_tool.printToXML(self.xml_output)
-            id_tool.run()
+        return model, id_tool, temp_xml
+
+    def run_id_tool(self, trial, time_range=None):
+        """
+        Run the inverse dynamics of a trial
+
+        Parameters
+        ----------
+        trial : Path
+            motion file
+        time_range : tuple, optional
+            start and end times of a window of the trial, written in a scratch directory to be
+            stitched (default: whole trial)
+
+        Returns
+        -------
+        tuple or str or None
+            manifest entry (or None) of the trial, or results directory of the window
+        """
+        if self.prefix and not trial.stem.startswith(self.prefix):
+            # skip file if user specified a prefix and prefix is not present in current file
+            pass
+        else:
+            output_name = self.output_name(trial)
+            coordinates = self.coordinates.get(trial.stem)
+
+            signature = None
+            if time_range is None:
+                if self.manifest and coordinates is None:
+                    signature = self.trial_signature(trial)
+                if signature and self.manifest.is_up_to_date(
+                        trial.stem, signature, [Path(self.sto_output, f'{output_name}.sto')]
+                ):
+                    print(f'\t{trial.stem} (up to date)')
+                    return None
+                print(f'\t{trial.stem}')
+                results_dir = self.sto_output
+            else:
+                print(f'\t{trial.stem} [{time_range[0]:.2f}, {time_range[1]:.2f}]')
+                results_dir = scratch_folder(trial.stem)
+            stage = self.__class__.__name__
+
+            # the tool does not own the model, keep a reference until it has run
+            model, id_tool, temp_xml = self.setup_tool(
+                trial, results_dir, time_range if time_range else self.time_range(trial)
+            )
+
+            try:
+                xml_output = None
+                if time_range is None:
+                    xml_output = trial_filename(self.xml_output, trial.stem, unique=self.multi)
+                if xml_output:
+                    with measure(stage, trial.stem, 'write_setup', self.instrument):
+                        id_tool.printToXML(xml_output)
+                with measure(stage, trial.stem, 'solve', self.instrument):
+                    id_tool.run()
+            finally:
+                if temp_xml:
+                    with measure(stage, trial.stem, 'cleanup', self.instrument):
+                        temp_xml.unlink()  # delete temporary xml file
 
-            if self.forces_dir:
-                temp_xml.unlink()  # delete temporary xml file
+            if time_range is not None:
+                return f'{results_dir}'
+            return (trial.stem, signature) if signature else None
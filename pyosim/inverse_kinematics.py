@@ -7,8 +7,15 @@ import opensim as osim
 
 import os
 
+from pyosim.fileio import read_header, read_time_range, trial_filename
+from pyosim.instrumentation import measure
+from pyosim.manifest import Manifest, inputs_signature
+from pyosim.parallel import (
+    ParallelTool, cached, dispatch, file_key, run_windows, scratch_dir, scratch_file,
+)
 
-class InverseKinematics:
+
+class InverseKinematics(ParallelTool):
     """
     Inverse kinematic in pyosim
 
@@ -18,24 +25,48 @@ class InverseKinematics:
         Path to the osim model
     xml_input : str
         Path to the generic ik xml
-    xml_output : str
-        Output path of the ik xml
+    xml_output : str, None
+        Output path of the ik xml (`{trial}` is replaced by the trial name, not written if None).
+        In multiprocessing, the trial name is appended
+        to the filename if it does not contain `{trial}`
     trc_files : str, list
         Path or list of path to the marker files (`.trc`)
-    mot_output : str
-        Output directory
+    mot_output : str, None
+        Output directory. If None, motion files are written in a scratch directory and removed once
+        loaded in `kinematics` (requires `keep_kinematics`)
     onsets : dict, optional
         Dictionary which contains the starting and ending point in second as values and trial name as keys
     prefix : str, optional
         Optional prefix to put in front of the output filename (typically model name)
+    incremental : bool, optional
+        Skip trials whose inputs (model, setup file, trc file and onsets) did not change since their
+        output was produced, according to the manifest stored in `mot_output`
+    instrument : callable, optional
+        Sink receiving the timing and memory events of each phase (default: `pyosim.set_sink`)
+    keep_kinematics : bool, optional
+        Keep the results in memory, as `osim.Storage` in the `kinematics` dict (motion file stem as
+        key), to be given as `coordinates` to the next stages (`InverseDynamics` and `AnalyzeTool`
+        subclasses) in the same process instead of reading the motion files again
+    shards : int, optional
+        Split each trial into this number of time windows stitched in one motion file (see
+        `pyosim.parallel.run_windows`). The setup of the whole trial is written to `xml_output`
+    overlap : float, optional
+        Duration (s) added on each side of the windows
+    cost_model : CostModel, optional
+        Cost model of the stage used with `multi` (see `pyosim.parallel.dispatch`)
+    index : FileIndex, optional
+        Index of the project containing `mot_output`, whose entry of `mot_output` is refreshed once
+        the trials are processed
     multi : bool, optional
-        Launch InverseKinematics in multiprocessing if True
+        Launch InverseKinematics in multiprocessing if True.
+        Trials are dispatched on the pool shared by pyosim tools (see `pyosim.close_pool` to shut it
+        down), each worker reads the model once and runs each trial on a fresh copy of it.
 
     Examples
     --------
     >>> from pathlib import Path
     >>>
-    >>> from pyosim import Conf
+    >>> from pyosim import Conf, FileIndex
     >>> from pyosim import InverseKinematics
     >>>
     >>> PROJECT_PATH = Path('../Misc/project_sample')
@@ -44,7 +75,8 @@ class InverseKinematics:
     >>> participant = 'dapo'
     >>> model = 'wu'
     >>>
-    >>> trials = [ifile for ifile in (PROJECT_PATH / participant / '0_markers').glob('*.trc')]
+    >>> index = FileIndex(PROJECT_PATH)
+    >>> trials = index.files(participant, '0_markers', suffix='.trc')
     >>> conf = Conf(project_path=PROJECT_PATH)
     >>> onsets = conf.get_conf_field(participant, ['onset'])
     >>>
@@ -55,8 +87,13 @@ class InverseKinematics:
     >>>     trc_files=trials,
     >>>     mot_output=f"{PROJECT_PATH / participant / '1_inverse_kinematic'}",
     >>>     onsets=onsets,
-    >>>     prefix=model
+    >>>     prefix=model,
+    >>>     index=index
     >>> )
+    >>>
+    >>> # chain stages in memory, without writing motion files
+    >>> ik = InverseKinematics(..., mot_output=None, keep_kinematics=True)
+    >>> InverseDynamics(..., mot_files=None, coordinates=ik.kinematics)
     """
 
     def __init__(
@@ -68,6 +105,13 @@ class InverseKinematics:
             mot_output,
             onsets=None,
             prefix=None,
+            incremental=False,
+            instrument=None,
+            keep_kinematics=False,
+            shards=None,
+            overlap=0.5,
+            cost_model=None,
+            index=None,
             multi=False
     ):
         self.model_input = model_input
@@ -77,6 +121,17 @@ class InverseKinematics:
         self.xml_output = xml_output
         self.multi = multi
         self.prefix = prefix
+        self.instrument = instrument
+        self.manifest = Manifest(mot_output) if incremental and mot_output else None
+        self.keep_kinematics = keep_kinematics
+        self.shards = shards
+        self.overlap = overlap
+        self.cost_model = cost_model
+        self.index = index
+        self.kinematics = {}
+
+        if mot_output is None and not keep_kinematics:
+            raise ValueError('mot_output can be None only if keep_kinematics is True')
 
         if not isinstance(trc_files, list):
             self.trc_files = [trc_files]
@@ -89,39 +144,139 @@ class InverseKinematics:
         self.main_loop()
 
     def main_loop(self):
-        if self.multi:
-            import os
-            from multiprocessing import Pool
-
-            pool = Pool(os.cpu_count())
-            pool.map(self.run_ik_tool, self.trc_files)
+        if self.shards:
+            results = self.run_sharded()
+        elif self.multi:
+            n_frames = [read_header(itrial)['n_frames'] for itrial in self.trc_files]
+            results = dispatch(
+                self.__class__.__name__, self.run_ik_tool, self.trc_files, n_frames,
+                cost_model=self.cost_model
+            )
+            if self.manifest:
+                self.manifest.record(entry for _, entry in results)
         else:
+            results = []
             for itrial in self.trc_files:
-                self.run_ik_tool(itrial)
+                results.append(self.run_ik_tool(itrial))
+                if self.manifest:
+                    self.manifest.record([results[-1][1]])
+
+        if self.keep_kinematics:
+            for ioutput, _ in results:
+                ioutput = Path(ioutput)
+                self.kinematics[ioutput.stem] = osim.Storage(f'{ioutput}')
+                if self.mot_output is None:
+                    ioutput.unlink()  # scratch file, the results are in memory
 
-    def run_ik_tool(self, trial):
-        model = osim.Model(self.model_input) if isinstance(self.model_input, str) else self.model_input
+        if self.index is not None and self.mot_output:
+            self.index.listdir(Path(self.mot_output).resolve(), stat_files=True)
 
-        print(f'\t{trial.stem}')
-        # initialize inverse kinematic tool from setup file
+    def load_tool(self):
+        """
+        Inverse kinematic tool initialized from the setup file with the model.
+        When `model_input` is a path, the model read from file is cached in the current process as
+        long as the file is not modified, and each trial gets a fresh copy of it: the state of a
+        trial never leaks into the next one.
+
+        Returns
+        -------
+        tuple
+            (osim.Model, osim.InverseKinematicsTool), keep a reference on the model until the tool
+            has run, the tool does not own it
+        """
+        model = self.model_input
+        if isinstance(model, str):
+            model = cached(
+                ('InverseKinematicsModel', file_key(self.model_input)),
+                lambda: osim.Model(self.model_input)
+            ).clone()
         ik_tool = osim.InverseKinematicsTool(self.xml_input)
         ik_tool.setModel(model)
+        return model, ik_tool
 
-        # set name of input (trc) file and output (mot)
+    def setup_tool(self, trial, filename, output, time_range):
+        """
+        Inverse kinematic tool set up for a trial
+
+        Parameters
+        ----------
+        trial : Path
+            marker file
+        filename : str
+            name of the tool
+        output : str
+            motion file
+        time_range : tuple
+            start and end times
+
+        Returns
+        -------
+        tuple
+            (osim.Model, osim.InverseKinematicsTool)
+        """
+        model, ik_tool = self.load_tool()
+        ik_tool.setName(filename)
+        ik_tool.setMarkerDataFileName(f'{trial}')
+        ik_tool.setOutputMotionFileName(output)
+        ik_tool.setResultsDir(os.path.dirname(output))
+        ik_tool.setStartTime(time_range[0])
+        ik_tool.setEndTime(time_range[1])
+        return model, ik_tool
+
+    def trial_signature(self, trial):
+        """
+        Signature of the inputs of a trial, None if it cannot be computed (model given as an
+        `osim.Model`)
+
+        Parameters
+        ----------
+        trial : Path
+            marker file
+
+        Returns
+        -------
+        dict or None
+        """
+        if not isinstance(self.model_input, str):
+            return None
+        onsets = self.onsets.get(trial.stem) if self.onsets else None
+        inputs = [self.model_input, self.xml_input, trial]
+        return inputs_signature(inputs, params={'onsets': onsets})
+
+    def output_file(self, trial):
+        """
+        Name and path of the motion file of a trial
+
+        Parameters
+        ----------
+        trial : Path
+            marker file
+
+        Returns
+        -------
+        tuple
+            (name, path)
+        """
         if self.prefix:
             filename = f"{self.prefix}_{trial.stem}"
         else:
             filename = trial.stem
-        ik_tool.setName(filename)
-        ik_tool.setMarkerDataFileName(f'{trial}')
-        output_motion_file_name = f"{self.mot_output}/{filename}.mot"
-        if not os.path.isdir(self.mot_output):
-            os.mkdir(self.mot_output)
-        with open(output_motion_file_name, 'w') as fp:
-            pass
-        ik_tool.setOutputMotionFileName(output_motion_file_name)
-        ik_tool.setResultsDir(self.mot_output)
+        output_dir = self.mot_output if self.mot_output else f'{scratch_dir()}'
+        return filename, f"{output_dir}/{filename}.mot"
+
+    def time_range(self, trial):
+        """
+        Start and end times of a trial, from the onsets or from the trc file
+
+        Parameters
+        ----------
+        trial : Path
+            marker file
 
+        Returns
+        -------
+        tuple
+        """
         if self.onsets:
             if trial.stem in self.onsets:
                 # set start and end times from configuration file
@@ -129,11 +284,104 @@ class InverseKinematics:
                 end = self.onsets[trial.stem][1]
         else:
             # use the trc file to get the start and end times
-            m = osim.MarkerData(f'{trial}')
-            start = m.getStartFrameTime()
-            end = m.getLastFrameTime() - 1e-2  # -1e-2 because removing last frame resolves some bug
-        ik_tool.setStartTime(start)
-        ik_tool.setEndTime(end)
-
-        ik_tool.printToXML(self.xml_output)
-        ik_tool.run()
+            with measure(self.__class__.__name__, trial.stem, 'read_header', self.instrument):
+                start, end = read_time_range(trial)
+            end -= 1e-2  # -1e-2 because removing last frame resolves some bug
+        return start, end
+
+    def run_sharded(self):
+        """
+        Run each trial as `shards` overlapping time windows (in parallel with `multi`) and stitch
+        their results
+
+        Returns
+        -------
+        list
+            (motion file, manifest entry or None) of each trial
+        """
+        results, trials = [], []
+        for itrial in self.trc_files:
+            filename, output = self.output_file(itrial)
+            signature = self.trial_signature(itrial) if self.manifest else None
+            if signature and self.manifest.is_up_to_date(filename, signature, [output]):
+                print(f'\t{itrial.stem} (up to date)')
+                results.append((output, None))
+                continue
+            trials.append((itrial, filename, output, self.time_range(itrial), signature))
+
+        run_windows(
+            self.__class__.__name__, self.run_ik_tool,
+            [(itrial, time_range, output) for itrial, _, output, time_range, _ in trials],
+            self.shards, self.overlap, multi=self.multi, instrument=self.instrument
+        )
+
+        for itrial, filename, output, time_range, signature in trials:
+            # setup of the whole trial, as written by unsharded runs
+            xml_output = trial_filename(self.xml_output, filename, unique=self.multi)
+            if xml_output:
+                with measure(self.__class__.__name__, itrial.stem, 'write_setup', self.instrument):
+                    _, ik_tool = self.setup_tool(itrial, filename, output, time_range)
+                    ik_tool.printToXML(xml_output)
+            results.append((output, (filename, signature) if signature else None))
+
+        if self.manifest:
+            self.manifest.record(entry for _, entry in results)
+        return results
+
+    def run_ik_tool(self, trial, time_range=None):
+        """
+        Run the inverse kinematic of a trial
+
+        Parameters
+        ----------
+        trial : Path
+            marker file
+        time_range : tuple, optional
+            start and end times of a window of the trial, written in a scratch file to be stitched
+            (default: whole trial)
+
+        Returns
+        -------
+        tuple or str
+            (motion file, manifest entry or None) of the trial, or motion file of the window
+        """
+        # set name of input (trc) file and output (mot)
+        filename, output_motion_file_name = self.output_file(trial)
+
+        signature = None
+        if time_range is None:
+            signature = self.trial_signature(trial) if self.manifest else None
+            outputs = [output_motion_file_name]
+            if signature and self.manifest.is_up_to_date(filename, signature, outputs):
+                print(f'\t{trial.stem} (up to date)')
+                return output_motion_file_name, None
+            print(f'\t{trial.stem}')
+        else:
+            output_motion_file_name = f"{scratch_file(filename, suffix='.mot')}"
+            print(f'\t{trial.stem} [{time_range[0]:.2f}, {time_range[1]:.2f}]')
+        output_dir = os.path.dirname(output_motion_file_name)
+        if not os.path.isdir(output_dir):
+            os.mkdir(output_dir)
+        with open(output_motion_file_name, 'w') as fp:
+            pass
+
+        stage = self.__class__.__name__
+        # initialize inverse kinematic tool from setup file, the tool does not own the model: keep a
+        # reference until it has run
+        with measure(stage, trial.stem, 'load_model', self.instrument):
+            model, ik_tool = self.setup_tool(
+                trial, filename, output_motion_file_name, time_range or self.time_range(trial)
+            )
+
+        xml_output = None
+        if time_range is None:
+            xml_output = trial_filename(self.xml_output, filename, unique=self.multi)
+        if xml_output:
+            with measure(stage, trial.stem, 'write_setup', self.instrument):
+                ik_tool.printToXML(xml_output)
+        with measure(stage, trial.stem, 'solve', self.instrument):
+            ik_tool.run()
+
+        if time_range is not None:
+            return output_motion_file_name
+        return output_motion_file_name, (filename, signature) if signature else None
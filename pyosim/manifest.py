@@ -0,0 +1,142 @@
+"""
+Manifest class in pyosim.
+Records the inputs used to produce the outputs of a directory, so that up to date trials can be
+skipped on re-runs.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_NAME = '.pyosim_manifest.json'
+
+
+def file_signature(filename, content=False):
+    """
+    Signature of a file
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file
+    content : bool, optional
+        hash the file content instead of using its size and modification time
+
+    Returns
+    -------
+    str or list
+        sha1 of the content or [size, modification time in ns]
+    """
+    if content:
+        sha = hashlib.sha1()
+        with open(filename, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                sha.update(block)
+        return sha.hexdigest()
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def inputs_signature(inputs, params=None, content=False):
+    """
+    Signature of the inputs of a trial
+
+    Parameters
+    ----------
+    inputs : list
+        input files (None values are ignored)
+    params : dict, optional
+        parameters that change the outputs
+    content : bool, optional
+        hash the files content instead of using their size and modification time
+
+    Returns
+    -------
+    dict
+    """
+    signature = {
+        'inputs': {
+            str(Path(ifile).resolve()): file_signature(ifile, content) for ifile in inputs if ifile
+        },
+        'params': params or {},
+    }
+    # json round trip so that signatures compare equal to the ones read from the manifest
+    return json.loads(json.dumps(signature, default=str))
+
+
+class Manifest:
+    """
+    Manifest of the inputs used to produce the outputs of a directory
+
+    Parameters
+    ----------
+    directory : str, Path
+        output directory, where the manifest is stored
+    name : str, optional
+        filename of the manifest
+    """
+
+    def __init__(self, directory, name=MANIFEST_NAME):
+        self.path = Path(directory) / name
+        self.entries = self._read()
+        # keys recorded by this object, the only ones it writes
+        self.changed = set()
+
+    def _read(self):
+        if not self.path.is_file():
+            return {}
+        with open(self.path) as file:
+            return json.load(file)
+
+    def is_up_to_date(self, key, signature, outputs):
+        """
+        Check if the outputs of an entry exist and were produced from the same inputs
+
+        Parameters
+        ----------
+        key : str
+            entry (typically the trial name)
+        signature : dict
+            signature of the current inputs (see `inputs_signature`)
+        outputs : list
+            output files
+
+        Returns
+        -------
+        bool
+        """
+        if self.entries.get(key) != signature or not outputs:
+            return False
+        return all(Path(i).is_file() for i in outputs)
+
+    def record(self, results):
+        """
+        Record entries and save the manifest
+
+        Parameters
+        ----------
+        results : iterable
+            (key, signature) tuples (None values, for skipped trials, are ignored)
+        """
+        results = [i for i in results if i]
+        if not results:
+            return
+        self.entries.update(results)
+        self.changed.update(key for key, _ in results)
+        self.save()
+
+    def save(self):
+        """
+        Write the manifest atomically, merged with the entries written by other jobs meanwhile:
+        only the entries recorded by this object are written, the other ones are read from disk
+        """
+        entries = self._read()
+        entries.update((key, self.entries[key]) for key in self.changed)
+        self.entries = entries
+        self.changed = set()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        with open(temp, 'w') as file:
+            json.dump(entries, file, indent=1)
+        os.replace(temp, self.path)
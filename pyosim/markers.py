@@ -5,6 +5,8 @@ import opensim as osim
 
 from pyomeca import Markers
 
+from pyosim.fileio import CHUNK_SIZE, write_trc
+
 
 class Markers3dOsim(Markers):
     def __new__(cls, *args, **kwargs):
@@ -17,13 +19,18 @@ class Markers3dOsim(Markers):
         if obj is None or not isinstance(obj, Markers3dOsim):
             return
 
-    def to_trc(self, filename):
+    def to_trc(self, filename, bulk=True, chunk_size=CHUNK_SIZE):
         """
         Write a trc file from a Markers3dOsim
         Parameters
         ----------
         filename : string
             path of the file to write
+        bulk : bool, optional
+            format the whole array at once instead of filling
+            an `osim.TimeSeriesTableVec3` frame by frame
+        chunk_size : int, optional
+            number of frames read at once by the bulk writer (bounds memory on long recordings)
         """
         filename = Path(filename)
         # Make sure the directory exists, otherwise create it
@@ -37,7 +44,23 @@ class Markers3dOsim(Markers):
             raise ValueError('get_unit is empty. Please fill with `your_variable.get_unit = "mm"` for example')
         if not self.get_labels:
             raise ValueError(
-                'get_labels is empty. Please fill with `your_variable.get_labels = ["M1", "M2"]` for example')
+                'get_labels is empty. '
+                'Please fill with `your_variable.get_labels = ["M1", "M2"]` for example')
+
+        time_vector = np.arange(start=0, stop=1 / self.get_rate * self.shape[2], step=1 / self.get_rate)
+
+        if bulk:
+            write_trc(
+                filename,
+                data=self,
+                labels=self.get_labels,
+                rate=self.get_rate,
+                unit=self.get_unit,
+                time=time_vector,
+                decimals=4,
+                chunk_size=chunk_size
+            )
+            return
 
         table = osim.TimeSeriesTableVec3()
 
@@ -46,8 +69,6 @@ class Markers3dOsim(Markers):
         table.addTableMetaDataString('DataRate', str(self.get_rate))
         table.addTableMetaDataString('Units', self.get_unit)
 
-        time_vector = np.arange(start=0, stop=1 / self.get_rate * self.shape[2], step=1 / self.get_rate)
-
         for iframe in range(self.shape[-1]):
             a = np.round(self.get_frame(iframe)[:-1, ...], decimals=4)
             row = osim.RowVectorOfVec3(
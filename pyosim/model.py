@@ -1,12 +1,56 @@
 """
 Model class in pyosim
 """
+from fnmatch import fnmatchcase
+
+import numpy as np
 import opensim as osim
 
 
 class Model(osim.Model):
     """Wrapper around opensim's osim models."""
 
+    def muscle_names(self, pattern=None):
+        """
+        Names of the muscles of the model
+
+        Parameters
+        ----------
+        pattern : str, list, optional
+            shell-style pattern(s) selecting the muscles by name
+            (`'delt*'`, `['supra*', 'infra*']`...)
+
+        Returns
+        -------
+        list
+        """
+        muscles = self.getMuscles()
+        names = [muscles.get(i).getName() for i in range(muscles.getSize())]
+        if pattern is None:
+            return names
+        patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+        return [
+            iname for iname in names if any(fnmatchcase(iname, ipattern) for ipattern in patterns)
+        ]
+
+    def max_isometric_forces(self, pattern=None):
+        """
+        Maximum isometric forces of the muscles, read once into an array
+
+        Parameters
+        ----------
+        pattern : str, list, optional
+            shell-style pattern(s) selecting the muscles by name (default: all the muscles)
+
+        Returns
+        -------
+        tuple
+            (muscle names, np.ndarray of forces)
+        """
+        names = self.muscle_names(pattern)
+        muscles = self.getMuscles()
+        return names, np.array([muscles.get(iname).getMaxIsometricForce() for iname in names])
+
     def strengthen(self, factor, output):
         """
         Strengthens a model by multiplying the maximum isometric forces of each muscle by the `factor` parameter
@@ -18,10 +62,89 @@ class Model(osim.Model):
         output : str
             New model path
         """
+        self.strengthen_batch([factor], outputs=[output])
+
+    def strengthen_batch(self, factors, outputs=None, pattern=None):
+        """
+        Generate strengthened variants of the model. The maximum isometric forces are read once and
+        each variant is set from them, on a single clone of the model when the variants are written
+        to disk.
+
+        Parameters
+        ----------
+        factors : list, np.ndarray
+            one factor per variant, or one vector of per-muscle factors per variant
+            (shape: variants x selected muscles)
+        outputs : list, str, optional
+            path of each variant, or a template where `{i}` and `{factor}` are replaced by the index
+            and the factor of the variant (`{factor}` only with one factor per variant). The paths
+            should be unique.
+            If None, the variants are returned as models in memory
+        pattern : str, list, optional
+            shell-style pattern(s) selecting the strengthened muscles by name (default: all the
+            muscles)
+
+        Returns
+        -------
+        list
+            paths of the written variants, or the models if `outputs` is None
+
+        Examples
+        --------
+        >>> model = Model('wu_scaled.osim')
+        >>> factors = np.linspace(0.5, 1.5, 11)
+        >>> model.strengthen_batch(factors, outputs='wu_strength_{factor:.1f}.osim')
+        >>> weak_deltoids = model.strengthen_batch([0.5, 0.8], pattern='DELT*')  # in memory
+        """
+        names, forces = self.max_isometric_forces(pattern)
+        if not names:
+            raise ValueError(f'pattern {pattern!r} matches no muscle of the model')
+        factors = np.asarray(factors, dtype=float)
+        if factors.ndim == 1:
+            factors = factors[:, np.newaxis]
+        if factors.shape[1] not in (1, len(names)):
+            raise ValueError(
+                f'factors should have 1 or {len(names)} columns (muscles), not {factors.shape[1]}'
+            )
+        new_forces = factors * forces
+
+        if outputs is not None:
+            if isinstance(outputs, (list, tuple)):
+                if len(outputs) != len(factors):
+                    raise ValueError(f'{len(outputs)} outputs for {len(factors)} variants')
+                outputs = [str(ioutput) for ioutput in outputs]
+            else:
+                if '{factor' in str(outputs) and factors.shape[1] > 1:
+                    raise ValueError('{factor} cannot be used with per-muscle factors, use {i}')
+                template = str(outputs)
+                outputs = [
+                    template.format(i=i, factor=ifactors[0]) for i, ifactors in enumerate(factors)
+                ]
+            if len(set(outputs)) != len(outputs):
+                raise ValueError(
+                    'outputs should be unique, each variant would overwrite the previous one'
+                )
+
+        def selected_muscles(model):
+            muscles = model.updMuscles()
+            return [muscles.get(iname) for iname in names]
+
+        if outputs is None:
+            variants = []
+            for ivariant in new_forces:
+                new_model = self.clone()
+                for imuscle, iforce in zip(selected_muscles(new_model), ivariant):
+                    imuscle.setMaxIsometricForce(iforce)
+                variants.append(new_model)
+            return variants
+
         new_model = self.clone()
-        output = str(output)
-        for i in range(new_model.getMuscles().getSize()):
-            current_muscle = new_model.getMuscles().get(i)
-            current_muscle.setMaxIsometricForce(current_muscle.getMaxIsometricForce() * factor)
-        new_model.printToXML(output)
-        print(f'{output} created')
+        muscles = selected_muscles(new_model)
+        written = []
+        for ivariant, output in enumerate(outputs):
+            for imuscle, iforce in zip(muscles, new_forces[ivariant]):
+                imuscle.setMaxIsometricForce(iforce)
+            new_model.printToXML(output)
+            print(f'{output} created')
+            written.append(output)
+        return written
@@ -0,0 +1,408 @@
+"""
+Parallel processing in pyosim.
+A long-lived process pool shared by the tools, and a per-process cache for the objects that are
+expensive to build (models, tools parsed from setup files), so that each worker builds them once and
+reuses them across trials and participants. Temporary files go to a per-process scratch directory,
+so that concurrent jobs never share them.
+"""
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from collections import OrderedDict
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from pathlib import Path
+
+from pyosim.fileio import stitch, time_windows
+from pyosim.instrumentation import measure
+
+# maximum number of cached objects per process
+CACHE_SIZE = 8
+
+# runs shorter than this (s) are not used to update the cost model (skipped or up-to-date trials)
+MIN_ELAPSED = 0.1
+
+_pool = None
+_cache = OrderedDict()
+_scratch = None
+
+
+def get_pool(processes=None):
+    """
+    Get the process pool shared by pyosim tools. It is created on first call and reused until
+    `close_pool` is called
+
+    Parameters
+    ----------
+    processes : int, optional
+        number of worker processes (default: number of cpu), only used when the pool is created
+
+    Returns
+    -------
+    multiprocessing.pool.Pool
+    """
+    global _pool
+    # a process forked after the pool was created inherits it without its handler threads
+    if _pool is None or _pool[0] != os.getpid():
+        _pool = os.getpid(), Pool(processes or os.cpu_count())
+    return _pool[1]
+
+
+def close_pool():
+    """Shut down the shared process pool (waits for pending tasks)"""
+    global _pool
+    if _pool is not None and _pool[0] == os.getpid():
+        _pool[1].close()
+        _pool[1].join()
+    _pool = None
+
+
+atexit.register(close_pool)
+
+
+def file_key(filename):
+    """
+    Cache key of a file, changing when the file is modified
+
+    Parameters
+    ----------
+    filename : str, Path
+        path of the file
+
+    Returns
+    -------
+    tuple
+        (resolved path, modification time in ns)
+    """
+    filename = os.path.abspath(filename)
+    return filename, os.stat(filename).st_mtime_ns
+
+
+def cached(key, factory):
+    """
+    Get an object from the per-process cache, building it with `factory` if it is not cached yet.
+    The least recently used objects are dropped when the cache holds more than `CACHE_SIZE` objects.
+
+    Parameters
+    ----------
+    key : hashable
+        cache key (use `file_key` for the files the object is built from)
+    factory : callable
+        function without arguments building the object
+
+    Returns
+    -------
+    object
+    """
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    value = factory()
+    _cache[key] = value
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return value
+
+
+def clear_cache():
+    """Empty the per-process cache"""
+    _cache.clear()
+
+
+def scratch_dir():
+    """
+    Scratch directory of the current process, removed when the process exits
+
+    Returns
+    -------
+    Path
+    """
+    global _scratch
+    # forked workers inherit the parent's directory, which they should not use
+    if _scratch is None or _scratch[0] != os.getpid():
+        path = tempfile.mkdtemp(prefix=f'pyosim-{os.getpid()}-')
+        Finalize(None, shutil.rmtree, args=(path, True), exitpriority=0)
+        _scratch = os.getpid(), path
+    return Path(_scratch[1])
+
+
+def scratch_file(name, suffix='.xml'):
+    """
+    Create a new empty file with a unique name in the scratch directory of the current process
+
+    Parameters
+    ----------
+    name : str
+        prefix of the filename (typically the trial name)
+    suffix : str, optional
+        file extension
+
+    Returns
+    -------
+    Path
+    """
+    fd, path = tempfile.mkstemp(prefix=f'{name}_', suffix=suffix, dir=scratch_dir())
+    os.close(fd)
+    return Path(path)
+
+
+def scratch_folder(name):
+    """
+    Create a new empty directory with a unique name in the scratch directory of the current process
+
+    Parameters
+    ----------
+    name : str
+        prefix of the directory name (typically the trial name)
+
+    Returns
+    -------
+    Path
+    """
+    return Path(tempfile.mkdtemp(prefix=f'{name}_', dir=scratch_dir()))
+
+
+def _timed_call(task):
+    index, func, args = task
+    tic = time.perf_counter()
+    result = func(*args)
+    return index, result, time.perf_counter() - tic
+
+
+def balanced_map(func, tasks, costs, processes=None):
+    """
+    Run `func(*args)` for each task on the shared pool, the most expensive tasks first (longest
+    processing time first). Tasks are handed one by one to the first free worker, so that the batch
+    finishes close to the total cost divided by the number of workers.
+
+    Parameters
+    ----------
+    func : callable
+        function (or bound method) to run, picklable
+    tasks : list
+        arguments (tuple) of each task
+    costs : list
+        estimated cost of each task (any unit)
+    processes : int, optional
+        number of worker processes, only used when the pool is created
+
+    Returns
+    -------
+    list
+        (result, elapsed time in s) of each task, in the order of `tasks`
+    """
+    order = sorted(range(len(tasks)), key=lambda i: costs[i], reverse=True)
+    results = [None] * len(tasks)
+    calls = [(i, func, tuple(tasks[i])) for i in order]
+    pool = get_pool(processes)
+    for index, result, elapsed in pool.imap_unordered(_timed_call, calls, chunksize=1):
+        results[index] = result, elapsed
+    return results
+
+
+class CostModel:
+    """
+    Cost per frame of each stage (s), learned from past runs with an exponential moving average,
+    optionally persisted in a json file. Used to estimate the duration of a trial from its number of
+    frames.
+
+    Parameters
+    ----------
+    filename : str, Path, optional
+        path of the json file where the costs are persisted across runs (`~/.pyosim/costs.json` for
+        example).
+        If None, the costs are only kept in memory
+    alpha : float, optional
+        weight of the last run in the moving average
+    default : float, optional
+        cost per frame of a stage without history
+    """
+
+    def __init__(self, filename=None, alpha=0.3, default=1e-2):
+        self.path = Path(filename).expanduser() if filename else None
+        self.alpha = alpha
+        self.default = default
+        self.costs = self._read()
+        # stages updated by this object, the only ones it writes
+        self.changed = set()
+
+    def _read(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (OSError, ValueError):  # missing, unreadable or corrupted file
+            return {}
+
+    def estimate(self, stage, n_frames):
+        """
+        Estimated duration of a trial (s)
+
+        Parameters
+        ----------
+        stage : str
+            stage (typically the tool class name)
+        n_frames : int
+            number of frames of the trial
+
+        Returns
+        -------
+        float
+        """
+        return n_frames * self.costs.get(stage, self.default)
+
+    def update(self, stage, n_frames, elapsed):
+        """
+        Update the cost per frame of a stage with a run
+
+        Parameters
+        ----------
+        stage : str
+            stage
+        n_frames : int
+            number of frames of the trial
+        elapsed : float
+            duration of the run (s)
+        """
+        if not n_frames or elapsed < MIN_ELAPSED:
+            return
+        cost = elapsed / n_frames
+        previous = self.costs.get(stage)
+        if previous is not None:
+            cost = self.alpha * cost + (1 - self.alpha) * previous
+        self.costs[stage] = cost
+        self.changed.add(stage)
+
+    def save(self):
+        """
+        Write the cost model atomically, merged with the stages updated by other jobs in the
+        meantime (only the stages updated by this object are written). Nothing is written for a
+        cost model kept in memory, and a file that cannot be written only emits a warning: the costs
+        are an optimization, they should not fail the runs whose durations they record.
+        """
+        if self.path is None:
+            return
+        costs = self._read()
+        costs.update((stage, self.costs[stage]) for stage in self.changed)
+        self.costs = costs
+        self.changed = set()
+        temp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp, 'w') as file:
+                json.dump(costs, file, indent=1)
+            os.replace(temp, self.path)
+        except OSError as error:
+            warnings.warn(f'cost model not saved: {error}')
+
+
+_COST_MODEL = CostModel()
+
+
+class ParallelTool:
+    """
+    Base of the tools whose trials run in worker processes: the project `index` is only used in the
+    main process, it is not sent to the workers
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['index'] = None
+        return state
+
+
+def dispatch(stage, func, trials, n_frames, cost_model=None, processes=None):
+    """
+    Run `func(trial)` for each trial on the shared pool, balanced by the cost estimated from the
+    number of frames of each trial, and update the cost model of the stage with the measured
+    durations
+
+    Parameters
+    ----------
+    stage : str
+        stage (typically the tool class name)
+    func : callable
+        function (or bound method) to run, picklable
+    trials : list
+        trials
+    n_frames : list
+        number of frames of each trial
+    cost_model : CostModel, optional
+        cost model (default: a cost model kept in memory, shared by the runs of the current process)
+    processes : int, optional
+        number of worker processes, only used when the pool is created
+
+    Returns
+    -------
+    list
+        result of each trial, in the order of `trials`
+    """
+    cost_model = cost_model or _COST_MODEL
+    costs = [cost_model.estimate(stage, i) for i in n_frames]
+    results = balanced_map(func, [(itrial,) for itrial in trials], costs, processes=processes)
+    for iframes, (_, elapsed) in zip(n_frames, results):
+        cost_model.update(stage, iframes, elapsed)
+    cost_model.save()
+    return [result for result, _ in results]
+
+
+def run_windows(stage, func, trials, shards, overlap=0.0, multi=False, instrument=None):
+    """
+    Run each trial as `shards` time windows extended by `overlap` on each side (see
+    `pyosim.fileio.time_windows`) and stitch the results of its windows, for long trials. With
+    `multi`, the windows of all the trials run on the shared pool, the longest first. The overlap
+    absorbs the transients of the filters and solvers at the edges of the windows and is discarded
+    when stitching.
+
+    Parameters
+    ----------
+    stage : str
+        stage (typically the tool class name)
+    func : callable
+        `func(trial, (start, end))` runs a window of a trial and returns its result: a file, or a
+        directory whose `.sto` files are stitched by name (picklable with `multi`)
+    trials : list
+        (trial, (start, end), output) of each trial, `output` being the stitched file or, when
+        `func` returns directories, the directory of the stitched files
+    shards : int
+        number of windows per trial
+    overlap : float, optional
+        duration (s) added on each side of the windows
+    multi : bool, optional
+        run the windows on the shared pool
+    instrument : callable, optional
+        sink receiving the `stitch` events (default: `pyosim.set_sink`)
+    """
+    windows = [time_windows(*time_range, shards, overlap) for _, time_range, _ in trials]
+    tasks = [
+        (itrial, iwindow[:2])
+        for (itrial, _, _), iwindows in zip(trials, windows) for iwindow in iwindows
+    ]
+    if multi:
+        costs = [end - start for _, (start, end) in tasks]  # windows duration
+        outputs = iter(result for result, _ in balanced_map(func, tasks, costs))
+    else:
+        outputs = (func(*itask) for itask in tasks)
+
+    for (itrial, _, output), iwindows in zip(trials, windows):
+        results = [Path(next(outputs)) for _ in iwindows]
+        keeps = [iwindow[2:] for iwindow in iwindows]
+        with measure(stage, itrial.stem, 'stitch', instrument):
+            if results[0].is_dir():
+                os.makedirs(output, exist_ok=True)
+                for ifile in sorted(results[0].glob('*.sto')):
+                    files = [iresult / ifile.name for iresult in results]
+                    stitch(files, Path(output, ifile.name), keeps)
+            else:
+                os.makedirs(Path(output).parent, exist_ok=True)
+                stitch(results, output, keeps)
+        for iresult in results:
+            if iresult.is_dir():
+                shutil.rmtree(iresult, ignore_errors=True)
+            else:
+                os.remove(iresult)
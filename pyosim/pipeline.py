@@ -0,0 +1,252 @@
+"""
+Pipeline class in pyosim
+"""
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from pyosim.index import FileIndex
+
+# participant directory written by each stage and stages it depends on
+STAGES = {
+    'scale': {'output_dir': '_models', 'requires': []},
+    'inverse_kinematic': {'output_dir': '1_inverse_kinematic', 'requires': ['scale']},
+    'inverse_dynamic': {'output_dir': '2_inverse_dynamic', 'requires': ['inverse_kinematic']},
+    'static_optimization': {
+        'output_dir': '3_static_optimization', 'requires': ['inverse_kinematic']
+    },
+    'muscle_analysis': {'output_dir': '4_muscle_analysis', 'requires': ['inverse_kinematic']},
+    'joint_reaction_force': {
+        'output_dir': '5_joint_reaction_force', 'requires': ['static_optimization']
+    },
+}
+
+
+class Stage:
+    """
+    Stage of a pipeline
+
+    Parameters
+    ----------
+    name : str
+        name of the stage (names of `pyosim.pipeline.STAGES` get their dependencies by default)
+    func : callable
+        module-level function called as `func(project_path, participant, trial)` (`trial` is None
+        for participant-level stages). It runs in a worker process, so it should launch pyosim tools
+        with `multi=False`
+    requires : list, optional
+        names of the stages whose outputs are inputs of this stage
+    per_trial : bool, optional
+        run the stage once per trial if True, else once per participant (default: False for `scale`,
+        True otherwise)
+    output_dir : str, optional
+        participant directory written by the stage, checked before running the stages requiring it
+        (default: the directory of `pyosim.pipeline.STAGES`, None to skip the check)
+    """
+
+    def __init__(self, name, func, requires=None, per_trial=None, output_dir=None):
+        self.name = name
+        self.func = func
+        if requires is None:
+            requires = STAGES[name]['requires'] if name in STAGES else []
+        self.requires = list(requires)
+        self.per_trial = name != 'scale' if per_trial is None else per_trial
+        if output_dir is None and name in STAGES:
+            output_dir = STAGES[name]['output_dir']
+        self.output_dir = output_dir
+
+
+def _run_task(func, project_path, participant, trial):
+    tic = time.perf_counter()
+    try:
+        func(project_path, participant, trial)
+    except Exception:
+        return 'failed', time.perf_counter() - tic, traceback.format_exc()
+    return 'done', time.perf_counter() - tic, None
+
+
+class Pipeline:
+    """
+    Run several stages for all the participants of a project, as a dependency graph of (participant,
+    trial, stage) tasks on a process pool. Each task is submitted as soon as the tasks producing its
+    inputs are done and its inputs exist (files of the trial in the `output_dir` of the required
+    stages), so that the next stages of a trial start without waiting for the other trials or
+    participants.
+
+    Parameters
+    ----------
+    conf : Conf
+        project configuration (participants to process)
+    stages : list
+        stages (`Stage`) of the pipeline
+    trials : callable, optional
+        function returning the trials names of a participant (default: stems of the `.trc` files in
+        `0_markers`, from the project's `FileIndex`)
+    processes : int, optional
+        number of worker processes (default: number of cpu)
+
+    Examples
+    --------
+    >>> from pyosim import Conf, InverseKinematics, Pipeline, Stage
+    >>>
+    >>> def ik(project_path, participant, trial):  # module-level function
+    >>>     InverseKinematics(
+    >>>         model_input=f"{project_path / participant / '_models' / 'wu'}_scaled_markers.osim",
+    >>>         xml_input=f"{project_path / '_templates' / 'wu'}_ik.xml",
+    >>>         xml_output=f"{project_path / participant / '_xml' / 'wu'}_ik_{{trial}}.xml",
+    >>>         trc_files=project_path / participant / '0_markers' / f'{trial}.trc',
+    >>>         mot_output=f"{project_path / participant / '1_inverse_kinematic'}",
+    >>>         prefix='wu'
+    >>>     )
+    >>>
+    >>> stages = [Stage('scale', scale), Stage('inverse_kinematic', ik)]
+    >>> pipeline = Pipeline(Conf(PROJECT_PATH), stages=stages)
+    >>> status = pipeline.run()
+    """
+
+    def __init__(self, conf, stages, trials=None, processes=None):
+        self.conf = conf
+        self.project_path = conf.project_path
+        self.stages = {istage.name: istage for istage in stages}
+        self.trials = trials if trials else self.default_trials
+        self.processes = processes or os.cpu_count()
+        self.index = FileIndex(self.project_path)
+
+        for istage in stages:
+            unknown = set(istage.requires).difference(self.stages)
+            if unknown:
+                raise ValueError(f'{istage.name} requires {unknown}, which are not in the pipeline')
+
+    def default_trials(self, participant):
+        """
+        Trials of a participant: stems of the `.trc` files in `0_markers`
+
+        Parameters
+        ----------
+        participant : str
+            participant
+
+        Returns
+        -------
+        list
+        """
+        return self.index.trials(participant)
+
+    def tasks(self):
+        """
+        Dependency graph of the pipeline
+
+        Returns
+        -------
+        dict
+            (participant, trial, stage) tasks as keys and the set of tasks they depend on as values
+        """
+        graph = {}
+        for iparticipant in self.conf.get_participants_to_process():
+            trials = self.trials(iparticipant)
+            for istage in self.stages.values():
+                for itrial in trials if istage.per_trial else [None]:
+                    requires = set()
+                    for irequired in istage.requires:
+                        required = self.stages[irequired]
+                        if not required.per_trial:
+                            requires.add((iparticipant, None, irequired))
+                        elif itrial is None:
+                            requires.update((iparticipant, i, irequired) for i in trials)
+                        else:
+                            requires.add((iparticipant, itrial, irequired))
+                    graph[(iparticipant, itrial, istage.name)] = requires
+        return graph
+
+    def missing_inputs(self, task):
+        """
+        Output directories of the stages required by a task without any file of its trial
+
+        Parameters
+        ----------
+        task : tuple
+            (participant, trial, stage)
+
+        Returns
+        -------
+        list
+        """
+        participant, trial, stage = task
+        missing = []
+        for irequired in self.stages[stage].requires:
+            required = self.stages[irequired]
+            if required.output_dir is None:
+                continue
+            files = self.index.files(
+                participant, required.output_dir, trial=trial if required.per_trial else None
+            )
+            if not files:
+                missing.append(f'{participant}/{required.output_dir}')
+        return missing
+
+    def run(self):
+        """
+        Run the pipeline. Tasks depending on a failed task, or whose inputs are missing, are
+        skipped.
+
+        Returns
+        -------
+        pandas.DataFrame
+            status (`done`, `failed` or `skipped`), duration and error of each task
+        """
+        graph = self.tasks()
+        self.index.save()
+        dependents = {itask: [] for itask in graph}
+        for itask, requires in graph.items():
+            for irequired in requires:
+                dependents[irequired].append(itask)
+        remaining = {itask: len(requires) for itask, requires in graph.items()}
+        status = {}
+
+        def skip(task):
+            for idependent in dependents[task]:
+                if idependent not in status:
+                    status[idependent] = ('skipped', 0.0, f'{task} did not succeed')
+                    skip(idependent)
+
+        with ProcessPoolExecutor(self.processes) as executor:
+            def submit(task):
+                missing = self.missing_inputs(task)
+                if missing:
+                    status[task] = ('skipped', 0.0, f"no input in {', '.join(missing)}")
+                    print(f"\t{' '.join(i for i in task if i)}: skipped")
+                    skip(task)
+                    return
+                participant, trial, stage = task
+                future = executor.submit(
+                    _run_task, self.stages[stage].func, self.project_path, participant, trial
+                )
+                running[future] = task
+
+            running = {}
+            for itask, count in remaining.items():
+                if count == 0:
+                    submit(itask)
+
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for ifuture in finished:
+                    task = running.pop(ifuture)
+                    status[task] = ifuture.result()
+                    print(f"\t{' '.join(i for i in task if i)}: {status[task][0]}")
+                    if status[task][0] != 'done':
+                        skip(task)
+                        continue
+                    for idependent in dependents[task]:
+                        remaining[idependent] -= 1
+                        if remaining[idependent] == 0 and idependent not in status:
+                            submit(idependent)
+        self.index.save()
+
+        return pd.DataFrame(
+            [(*itask, *istatus) for itask, istatus in status.items()],
+            columns=['participant', 'trial', 'stage', 'status', 'duration', 'error']
+        )
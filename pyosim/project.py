@@ -6,6 +6,19 @@ from pathlib import Path
 
 import pandas as pd
 
+PARTICIPANT_DIRS = [
+    '_xml',  # generated XMLs
+    '_models',  # generated models
+    '0_markers',  # markers in TRC format
+    '0_emg',  # emg in STO format
+    '0_forces',  # forces in STO format
+    '1_inverse_kinematic',  # generated MOT motion files from inverse kinematic
+    '2_inverse_dynamic',  # generated STO files from inverse dynamic
+    '3_static_optimization',  # generated STO files from static optimization
+    '4_muscle_analysis',  # generated STO files from muscle analysis
+    '5_joint_reaction_force'  # generated STO files from joint reaction force analysis
+]
+
 
 class Project:
     """
@@ -68,25 +81,14 @@ class Project:
         4. write a configuration file in each participant directory
         """
         conf = pd.read_csv(self.path / '_conf.csv')
-
-        participant_dirs = [
-            '_xml',  # generated XMLs
-            '_models',  # generated models
-            '0_markers',  # markers in TRC format
-            '0_emg',  # emg in STO format
-            '0_forces',  # forces in STO format
-            '1_inverse_kinematic',  # generated MOT motion files from inverse kinematic
-            '2_inverse_dynamic',  # generated STO files from inverse dynamic
-            '3_static_optimization',  # generated STO files from static optimization
-            '4_muscle_analysis',  # generated STO files from muscle analysis
-            '5_joint_reaction_force'  # generated STO files from joint reaction force analysis
-        ]
+        # single listing of the project directory
+        existing = {ifile.name for ifile in self.path.iterdir()}
 
         count = 0
         for index, irow in conf.iterrows():
-            if irow['process'] and not list(self.path.glob(f"{irow['participant']}")):
+            if irow['process'] and irow['participant'] not in existing:
                 count += 1
-                for idir in participant_dirs:
+                for idir in PARTICIPANT_DIRS:
                     (self.path / irow['participant'] / idir).mkdir(parents=True)
 
                 # create conf file
@@ -2,8 +2,19 @@
 Scale class in pyosim
 """
 
-import opensim as osim
 import locale
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import opensim as osim
+import pandas as pd
+
+from pyosim.fileio import read_time_range
+from pyosim.instrumentation import measure
+from pyosim.manifest import Manifest, inputs_signature
 
 
 class Scale:
@@ -32,6 +43,13 @@ class Scale:
         Append the specified model
     remove_unused : bool
         If unused markers have to be removed (default = True in OpenSim)
+    incremental : bool, optional
+        Skip the scaling if the generic model, the setup file, the static trial, the added model and
+        the anthropometric parameters did not change since the outputs were produced (content hash
+        stored in the manifest of the `model_output` directory). `up_to_date` is True when the
+        scaling is skipped
+    instrument : callable, optional
+        Sink receiving the timing and memory events of each phase (default: `pyosim.set_sink`)
 
     Examples
     --------
@@ -82,18 +100,43 @@ class Scale:
         age=-1,
         add_model=None,
         remove_unused=True,
-        coordinate_file_name=None
+        coordinate_file_name=None,
+        incremental=False,
+        instrument=None,
     ):
         # Set US locale in case of not by default (works for linux)
         locale.setlocale(category=locale.LC_ALL, locale='en_US.utf8')
-        self.model = osim.Model(model_input)
+        self.instrument = instrument
+        trial = Path(static_path).stem
         self.model_output = model_output
         self.model_with_markers_output = model_output.replace(".osim", "_markers.osim")
         self.static_path = static_path
         self.xml_output = xml_output
         self.coordinate_file_name = coordinate_file_name
-
-        self.time_range = self.time_range_from_static()
+        self.remove_unused = remove_unused
+        self.unplaced_model = None
+        self.model = None
+        self.up_to_date = False
+
+        manifest, key, signature = None, Path(model_output).name, None
+        if incremental:
+            manifest = Manifest(Path(model_output).parent)
+            signature = inputs_signature(
+                [model_input, xml_input, static_path, add_model, coordinate_file_name],
+                params={'mass': mass, 'height': height, 'age': age, 'remove_unused': remove_unused},
+                content=True
+            )
+            outputs = [self.model_output, self.model_with_markers_output, self.xml_output]
+            if manifest.is_up_to_date(key, signature, outputs):
+                print(f'\t{trial} (up to date)')
+                self.up_to_date = True
+                return
+
+        with measure('Scale', trial, 'load_model', instrument):
+            self.model = osim.Model(model_input)
+
+        with measure('Scale', trial, 'read_header', instrument):
+            self.time_range = self.time_range_from_static()
 
         # initialize scale tool from setup file
         self.scale_tool = osim.ScaleTool(xml_input)
@@ -106,19 +149,27 @@ class Scale:
         # Tell scale tool to use the loaded model
         self.scale_tool.getGenericModelMaker().setModelFileName(model_input)
 
-        self.run_model_scaler(mass)
-        self.run_marker_placer()
+        with measure('Scale', trial, 'model_scaler', instrument):
+            self.run_model_scaler(mass)
+        with measure('Scale', trial, 'marker_placer', instrument):
+            self.run_marker_placer()
 
         if add_model:
-            self.combine_models(add_model)
+            with measure('Scale', trial, 'combine_models', instrument):
+                self.combine_models(add_model)
 
         if not remove_unused:
-            self.add_unused_markers()
+            with measure('Scale', trial, 'add_unused_markers', instrument):
+                self.add_unused_markers()
+
+        with measure('Scale', trial, 'write_outputs', instrument):
+            self.write_outputs()
+
+        if manifest:
+            manifest.record([(key, signature)])
 
     def time_range_from_static(self):
-        static = osim.MarkerData(self.static_path)
-        initial_time = static.getStartFrameTime()
-        final_time = static.getLastFrameTime()
+        initial_time, final_time = read_time_range(self.static_path)
         range_time = osim.ArrayDouble()
         range_time.set(0, initial_time)
         range_time.set(1, final_time)
@@ -153,8 +204,8 @@ class Scale:
         # Indicating whether or not to preserve relative mass between segments
         model_scaler.setPreserveMassDist(True)
 
-        # Name of model file (.osim) to write when done scaling
-        model_scaler.setOutputModelFileName(self.model_output)
+        # the scaled model stays in memory, it is written by `write_outputs`
+        model_scaler.setOutputModelFileName("Unassigned")
 
         # Filename to write scale factors that were applied to the unscaled model (optional)
         model_scaler.setOutputScaleFileName(
@@ -164,9 +215,10 @@ class Scale:
         model_scaler.processModel(self.model, "", mass)
 
     def run_marker_placer(self):
-        # load a scaled model
-        scaled_model = osim.Model(self.model_output)
-        # scaled_model = osim.Model(self.model)
+        if not self.remove_unused:
+            # markers absent from the static trial are removed by the marker placer, keep them for
+            # `add_unused_markers`
+            self.unplaced_model = self.model.clone()
 
         marker_placer = self.scale_tool.getMarkerPlacer()
         # Whether or not to use the model scaler during scale`
@@ -178,23 +230,29 @@ class Scale:
         if self.coordinate_file_name:
             marker_placer.setCoordinateFileName(self.coordinate_file_name)
 
-        # Name of model file (.osim) to write when done scaling
-        marker_placer.setOutputModelFileName(self.model_with_markers_output)
+        # the placed model stays in memory, it is written by `write_outputs`
+        marker_placer.setOutputModelFileName("Unassigned")
 
         # Maximum amount of movement allowed in marker data when averaging
         marker_placer.setMaxMarkerMovement(-1)
 
-        marker_placer.processModel(scaled_model)
+        marker_placer.processModel(self.model)
+
+        # save processed model (before the unused markers and the added model)
+        self.model.printToXML(self.model_output)
 
-        # save processed model
-        scaled_model.printToXML(self.model_output)
+    def write_outputs(self):
+        """Write the model with markers and the scale setup, once all the steps are done"""
+        self.model.printToXML(self.model_with_markers_output)
 
-        # print scale config to xml
+        # print scale config to xml, with the output files actually written
+        self.scale_tool.getModelScaler().setOutputModelFileName(self.model_output)
+        self.scale_tool.getMarkerPlacer().setOutputModelFileName(self.model_with_markers_output)
         self.scale_tool.printToXML(self.xml_output)
 
     def add_unused_markers(self):
-        with_unused = osim.Model(self.model_output)
-        without_unused = osim.Model(self.model_with_markers_output)
+        with_unused = self.unplaced_model
+        without_unused = self.model
 
         with_unused_markerset = with_unused.getMarkerSet()
         without_unused_markerset = without_unused.getMarkerSet()
@@ -214,11 +272,9 @@ class Scale:
             m = with_unused_markerset.get(idiff).clone()
             without_unused.addMarker(m)
 
-        without_unused.printToXML(self.model_with_markers_output)
-
     def combine_models(self, model_to_add):
-        # Open the models
-        osim_base = osim.Model(self.model_output)
+        # Open the model to add, the base is the placed model in memory
+        osim_base = self.model
         osim_to_add = osim.Model(model_to_add)
 
         bodies = osim_to_add.getBodySet()
@@ -253,6 +309,106 @@ class Scale:
             osim_base.addMarker(marker.clone())
 
         osim_base.initSystem()
-
-        osim_base.printToXML(self.model_with_markers_output)
         print(f"{model_to_add} added to {self.model_with_markers_output}")
+
+
+def _set_locale():
+    # Set US locale in case of not by default (works for linux)
+    locale.setlocale(category=locale.LC_ALL, locale='en_US.utf8')
+
+
+def _scale_participant(participant, kwargs):
+    tic = time.perf_counter()
+    try:
+        Scale(**kwargs)
+    except Exception:
+        return participant, 'failed', time.perf_counter() - tic, traceback.format_exc()
+    return participant, 'done', time.perf_counter() - tic, None
+
+
+def batch_scale(conf, model_input, model_output, xml_input, xml_output, static_path,
+                participants=None, height_factor=1, processes=None, **kwargs):
+    """
+    Scale the participants of a project on a process pool (one participant per worker process, each
+    worker setting its own locale), with the mass and height of the participants' configuration
+    files
+
+    Parameters
+    ----------
+    conf : Conf
+        project configuration
+    model_input, model_output, xml_input, xml_output, static_path : str, callable
+        paths given to `Scale`, as templates where `{participant}` and `{project}` are replaced by
+        the participant and the project path, or functions returning the path of a participant
+    participants : list, optional
+        participants to scale (default: `conf.get_participants_to_process()`)
+    height_factor : float, optional
+        factor converting the height of the configuration files to mm (10 if they are in cm)
+    processes : int, optional
+        number of worker processes (default: number of cpu)
+    kwargs
+        other parameters of `Scale` (`add_model`, `remove_unused`...)
+
+    Returns
+    -------
+    pandas.DataFrame
+        status (`done` or `failed`), duration and error of each participant
+
+    Examples
+    --------
+    >>> from pyosim import Conf, batch_scale
+    >>>
+    >>> conf = Conf(project_path=PROJECT_PATH)
+    >>> status = batch_scale(
+    >>>     conf,
+    >>>     model_input=f'{MODELS_PATH / model}.osim',
+    >>>     model_output=f"{{project}}/{{participant}}/_models/{model}_scaled.osim",
+    >>>     xml_input=f'{TEMPLATES_PATH / model}_scaling.xml',
+    >>>     xml_output=f"{{project}}/{{participant}}/_xml/{model}_scaled.xml",
+    >>>     static_path=lambda participant: conf.get_conf_field(participant, ['static']),
+    >>>     height_factor=10,
+    >>>     remove_unused=False
+    >>> )
+    >>> status[status['status'] == 'failed']
+    """
+    paths = {
+        'model_input': model_input,
+        'model_output': model_output,
+        'xml_input': xml_input,
+        'xml_output': xml_output,
+        'static_path': static_path,
+    }
+
+    def fill(template, participant):
+        if callable(template):
+            return str(template(participant))
+        return str(template).format(participant=participant, project=conf.project_path)
+
+    def field(participant, name, factor=1):
+        try:
+            value = conf.get_conf_field(participant, [name])
+        except KeyError:
+            return -1
+        return -1 if value is None or value != value else value * factor  # missing or nan
+
+    jobs = {}
+    for iparticipant in participants or conf.get_participants_to_process():
+        jobs[iparticipant] = {
+            **{ikey: fill(ivalue, iparticipant) for ikey, ivalue in paths.items()},
+            'mass': field(iparticipant, 'mass'),
+            'height': field(iparticipant, 'height', height_factor),
+            **kwargs,
+        }
+
+    rows = []
+    with ProcessPoolExecutor(processes or os.cpu_count(), initializer=_set_locale) as executor:
+        futures = [
+            executor.submit(_scale_participant, iparticipant, ikwargs)
+            for iparticipant, ikwargs in jobs.items()
+        ]
+        for ifuture in as_completed(futures):
+            rows.append(ifuture.result())
+            print(f"\t{rows[-1][0]}: {rows[-1][1]}")
+
+    status = pd.DataFrame(rows, columns=['participant', 'status', 'duration', 'error'])
+    return status.sort_values('participant').reset_index(drop=True)
@@ -0,0 +1,424 @@
+"""
+Project store in pyosim
+"""
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from pyosim.conf import dict_merge, write_json
+from pyosim.index import FileIndex, is_trial_file
+from pyosim.pipeline import STAGES
+
+STORE_NAME = '_project.sqlite'
+
+# columns of the project configuration file (`_conf.csv`)
+PARTICIPANT_COLUMNS = [
+    'participant', 'sex', 'laterality', 'group', 'mass', 'height', 'conf_file', 'process'
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS participants (
+    participant TEXT PRIMARY KEY,
+    sex TEXT,
+    laterality TEXT,
+    "group" TEXT,
+    mass REAL,
+    height REAL,
+    conf_file TEXT,
+    process INTEGER,
+    fields TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS trials (
+    participant TEXT NOT NULL REFERENCES participants(participant) ON DELETE CASCADE,
+    trial TEXT NOT NULL,
+    onset_start REAL,
+    onset_end REAL,
+    PRIMARY KEY (participant, trial)
+);
+CREATE TABLE IF NOT EXISTS status (
+    participant TEXT NOT NULL,
+    trial TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL,
+    PRIMARY KEY (participant, trial, stage),
+    FOREIGN KEY (participant, trial) REFERENCES trials(participant, trial) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS participants_group ON participants("group", process);
+CREATE INDEX IF NOT EXISTS status_stage ON status(stage, status, participant, trial);
+"""
+
+
+class ProjectStore:
+    """
+    Project metadata in a single SQLite file: participants table, participants' configuration
+    fields, trials with their onsets and status of each (participant, trial, stage).
+    It can be imported from and exported to the `_conf.csv` and `_conf.json` layout used by `Conf`.
+
+    Parameters
+    ----------
+    filename : str, Path
+        Path to the database (created if it does not exist)
+
+    Examples
+    --------
+    >>> from pyosim import ProjectStore
+    >>>
+    >>> # import `_conf.csv`, `_conf.json`, trials and outputs
+    >>> store = ProjectStore.from_project(PROJECT_PATH)
+    >>> store.get_conf_field('dapo', ['mass'])
+    >>> store.pending('static_optimization', group='1')  # trials of the group 1 not yet through SO
+    >>> store.set_status('dapo', 'IRSST_DapOd1', 'static_optimization')
+    >>> store.export_layout(PROJECT_PATH)  # back to `_conf.csv` and `_conf.json` files
+    """
+
+    def __init__(self, filename):
+        self.filename = Path(filename)
+        self.connection = sqlite3.connect(str(self.filename))
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(_SCHEMA)
+
+    @classmethod
+    def from_project(cls, project_path, filename=None, conf_file='_conf.csv'):
+        """
+        Create or update a store from a project directory
+
+        Parameters
+        ----------
+        project_path : str, Path
+            Path to the project
+        filename : str, Path, optional
+            Path to the database (default: `_project.sqlite` in the project directory)
+        conf_file : str, optional
+            Filename of the configuration file
+
+        Returns
+        -------
+        ProjectStore
+        """
+        project_path = Path(project_path)
+        store = cls(filename or project_path / STORE_NAME)
+        store.import_layout(project_path, conf_file=conf_file)
+        return store
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def import_layout(self, project_path, conf_file='_conf.csv'):
+        """
+        Import the project configuration file, the participants' configuration files, the trials
+        (`.trc` files in `0_markers` and onsets) and the stages already done (trials having a file
+        in the stage output directory, see `pyosim.pipeline.STAGES`). Directories are listed through
+        the project's `FileIndex`
+
+        Parameters
+        ----------
+        project_path : str, Path
+            Path to the project
+        conf_file : str, optional
+            Filename of the configuration file
+        """
+        project_path = Path(project_path)
+        project_conf = pd.read_csv(project_path / conf_file)
+        project_conf = project_conf.astype(object).where(project_conf.notnull(), None)
+
+        index = FileIndex(project_path)
+        participants, trials, status = [], [], []
+        now = time.time()
+        for irow in project_conf.to_dict('records'):
+            participant = irow['participant']
+            participant_path = project_path / participant
+            conf_path = irow.get('conf_file') or participant_path / '_conf.json'
+            fields = {}
+            if Path(conf_path).is_file():
+                with open(conf_path) as file:
+                    fields = json.load(file)
+            onsets = fields.pop('onset', None) or {}
+
+            columns = [irow.get(icol) for icol in PARTICIPANT_COLUMNS[1:]]
+            participants.append([participant, *columns, json.dumps(fields)])
+
+            names = set(index.trials(participant)) | set(onsets)
+            for itrial in names:
+                trials.append([participant, itrial] + list(onsets.get(itrial, [None, None]))[:2])
+
+            for istage, iparams in STAGES.items():
+                if istage == 'scale':
+                    continue
+                outputs = index.files(participant, iparams['output_dir'])
+                status.extend([participant, itrial, istage, 'done', now] for itrial in names
+                              if any(is_trial_file(ifile, itrial) for ifile in outputs))
+
+        index.save()
+        with self.connection:
+            # upserts: replacing the rows would cascade to the trials and status already recorded
+            updates = ', '.join(
+                f'"{icol}" = excluded."{icol}"' for icol in PARTICIPANT_COLUMNS[1:] + ['fields']
+            )
+            self.connection.executemany(
+                'INSERT INTO participants VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                f'ON CONFLICT(participant) DO UPDATE SET {updates}',
+                participants
+            )
+            self.connection.executemany(
+                'INSERT INTO trials VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(participant, trial) DO UPDATE SET '
+                'onset_start = COALESCE(excluded.onset_start, onset_start), '
+                'onset_end = COALESCE(excluded.onset_end, onset_end)',
+                trials
+            )
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO status VALUES (?, ?, ?, ?, ?)', status
+            )
+
+    def export_layout(self, project_path, conf_file='_conf.csv'):
+        """
+        Write the project configuration file and the participants' configuration files
+
+        Parameters
+        ----------
+        project_path : str, Path
+            Path to the project
+        conf_file : str, optional
+            Filename of the configuration file
+        """
+        project_path = Path(project_path)
+        participants = self.participants_table()
+        for iparticipant in participants['participant']:
+            data = self.load_conf(iparticipant)
+            conf_path = data.get('conf_file') or project_path / iparticipant / '_conf.json'
+            if Path(conf_path).parent.is_dir():
+                write_json(conf_path, data)
+        participants.drop(columns='fields').to_csv(project_path / conf_file, index=False)
+
+    def participants_table(self):
+        """
+        Participants table
+
+        Returns
+        -------
+        pandas DataFrame
+        """
+        columns = ', '.join(f'"{icol}"' for icol in PARTICIPANT_COLUMNS + ['fields'])
+        return self.query(f'SELECT {columns} FROM participants ORDER BY participant')
+
+    def get_participants_to_process(self, group=None):
+        """
+        Get a list of participants with the flag 'process'
+
+        Parameters
+        ----------
+        group : str, optional
+            only the participants of this group
+
+        Returns
+        -------
+        list
+        """
+        sql = 'SELECT participant FROM participants WHERE process'
+        params = []
+        if group is not None:
+            sql += ' AND "group" = ?'
+            params.append(str(group))
+        return [irow[0] for irow in self.connection.execute(sql + ' ORDER BY participant', params)]
+
+    def load_conf(self, participant):
+        """
+        Get participant's configuration, as in its `_conf.json` file
+
+        Parameters
+        ----------
+        participant : str
+            Participant
+
+        Returns
+        -------
+        dict
+        """
+        row = self.connection.execute(
+            'SELECT fields FROM participants WHERE participant = ?', (participant,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f'{participant} is not in the project store')
+        data = json.loads(row[0])
+        onsets = self.onsets(participant)
+        if onsets:
+            data['onset'] = onsets
+        return data
+
+    def get_conf_field(self, participant, field):
+        """
+        Get participant's specific configuration field
+
+        Parameters
+        ----------
+        participant : str
+            Participant
+        field : list
+            Field(s) to search in the configuration
+
+        Returns
+        -------
+        str
+        """
+        value = self.load_conf(participant)
+        for k in field:
+            value = value[k]
+        return value
+
+    def add_conf_field(self, d):
+        """
+        Update participants' configurations from a dictionary.
+        The keys should be the participant's pseudo
+
+        Parameters
+        ----------
+        d : dict
+            Dictionary to merge in the configurations
+        """
+        with self.connection:
+            for iparticipant, ivalue in d.items():
+                data = self.load_conf(iparticipant)
+                onsets = dict_merge(data, ivalue).pop('onset', None)
+                self.connection.execute(
+                    'UPDATE participants SET fields = ? WHERE participant = ?',
+                    (json.dumps(data), iparticipant)
+                )
+                if onsets:
+                    self.set_onsets(iparticipant, onsets)
+
+    def onsets(self, participant):
+        """
+        Get participant's onsets
+
+        Parameters
+        ----------
+        participant : str
+            Participant
+
+        Returns
+        -------
+        dict
+            {trial: [start, end]}
+        """
+        rows = self.connection.execute(
+            'SELECT trial, onset_start, onset_end FROM trials '
+            'WHERE participant = ? AND onset_start IS NOT NULL',
+            (participant,)
+        )
+        return {itrial: [start, end] for itrial, start, end in rows}
+
+    def set_onsets(self, participant, onsets):
+        """
+        Set participant's onsets (trials are added if needed)
+
+        Parameters
+        ----------
+        participant : str
+            Participant
+        onsets : dict
+            {trial: [start, end]}
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO trials VALUES (?, ?, ?, ?) ON CONFLICT(participant, trial) '
+                'DO UPDATE SET onset_start = excluded.onset_start, onset_end = excluded.onset_end',
+                [(participant, itrial, ivalue[0], ivalue[1]) for itrial, ivalue in onsets.items()]
+            )
+
+    def set_status(self, participant, trial, stage, status='done'):
+        """
+        Set the status of a stage for a trial (the trial is added if needed)
+
+        Parameters
+        ----------
+        participant : str
+            Participant
+        trial : str
+            Trial name
+        stage : str
+            Stage name (see `pyosim.pipeline.STAGES`)
+        status : str, optional
+            Status (`done`, `failed`...)
+        """
+        self.set_statuses([(participant, trial, stage, status)])
+
+    def set_statuses(self, rows):
+        """
+        Set the status of several (participant, trial, stage) in one transaction
+
+        Parameters
+        ----------
+        rows : iterable
+            (participant, trial, stage, status) tuples, for example the rows of the table returned
+            by `Pipeline.run`
+        """
+        rows = [tuple(irow) for irow in rows]
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO trials (participant, trial) VALUES (?, ?)',
+                {(irow[0], irow[1]) for irow in rows}
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO status VALUES (?, ?, ?, ?, ?)',
+                [irow + (now,) for irow in rows]
+            )
+
+    def pending(self, stage, group=None, status='done'):
+        """
+        Trials of the participants to process that do not have the `status` for `stage`
+
+        Parameters
+        ----------
+        stage : str
+            Stage name
+        group : str, optional
+            only the participants of this group
+        status : str, optional
+            status considered as completed
+
+        Returns
+        -------
+        pandas DataFrame
+            participant and trial columns
+        """
+        sql = (
+            'SELECT t.participant, t.trial FROM trials t '
+            'JOIN participants p ON p.participant = t.participant '
+            'WHERE p.process AND NOT EXISTS (SELECT 1 FROM status s '
+            'WHERE s.participant = t.participant AND s.trial = t.trial '
+            'AND s.stage = ? AND s.status = ?)'
+        )
+        params = [stage, status]
+        if group is not None:
+            sql += ' AND p."group" = ?'
+            params.append(str(group))
+        return self.query(sql + ' ORDER BY t.participant, t.trial', params)
+
+    def query(self, sql, params=()):
+        """
+        Run a SQL query on the store
+
+        Parameters
+        ----------
+        sql : str
+            query
+        params : sequence, optional
+            query parameters
+
+        Returns
+        -------
+        pandas DataFrame
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
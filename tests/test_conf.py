@@ -0,0 +1,67 @@
+import json
+
+import pandas as pd
+import pytest
+
+from pyosim import conf as conf_module
+from pyosim.conf import Conf
+
+
+@pytest.fixture
+def project(tmp_path):
+    rows = []
+    for iparticipant in ['dapo', 'davo']:
+        (tmp_path / iparticipant).mkdir()
+        conf_file = tmp_path / iparticipant / '_conf.json'
+        conf_file.write_text(json.dumps({'mass': 70}))
+        rows.append({'participant': iparticipant, 'process': True, 'conf_file': str(conf_file)})
+    pd.DataFrame(rows).to_csv(tmp_path / '_conf.csv', index=False)
+    return tmp_path
+
+
+def read_json(filename):
+    with open(filename) as file:
+        return json.load(file)
+
+
+def test_batch_flush(project, monkeypatch):
+    written = []
+    write_json = conf_module.write_json
+
+    def counting_write_json(filename, data):
+        written.append(filename)
+        write_json(filename, data)
+
+    monkeypatch.setattr(conf_module, 'write_json', counting_write_json)
+    conf = Conf(project)
+    conf_file = project / 'dapo' / '_conf.json'
+
+    with conf.batch():
+        conf.add_conf_field({'dapo': {'model': 'wu'}})
+        with conf.batch():
+            conf.add_conf_field({'dapo': {'height': 1700}, 'davo': {'model': 'das'}})
+        # nothing written before leaving the outermost block, updates visible in memory
+        assert not written
+        assert read_json(conf_file) == {'mass': 70}
+        assert conf.get_conf_field('dapo', ['model']) == 'wu'
+
+    # each modified file written once
+    assert sorted(written) == sorted([str(conf_file), str(project / 'davo' / '_conf.json')])
+    assert read_json(conf_file) == {'mass': 70, 'model': 'wu', 'height': 1700}
+    assert read_json(project / 'davo' / '_conf.json') == {'mass': 70, 'model': 'das'}
+
+
+def test_update_without_batch(project):
+    conf = Conf(project)
+    conf.add_conf_field({'dapo': {'onset': {'trial1': [0, 1]}}})
+    assert read_json(project / 'dapo' / '_conf.json')['onset'] == {'trial1': [0, 1]}
+
+
+def test_duplicated_participant(project):
+    project_conf = pd.read_csv(project / '_conf.csv')
+    duplicate = project_conf.iloc[[0]].assign(conf_file=str(project / 'dapo' / '_old_conf.json'))
+    pd.concat([project_conf, duplicate]).to_csv(project / '_conf.csv', index=False)
+
+    # first row, as a lookup in the table
+    conf = Conf(project)
+    assert conf.get_conf_path('dapo') == str(project / 'dapo' / '_conf.json')
@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import numpy as np
+
+from pyosim import fileio
+from pyosim.fileio import (
+    read_header, read_sto, read_trc, stitch, time_windows, write_sto, write_trc,
+)
+
+DATA = Path(__file__).parent / 'data'
+
+# header of a motion file written by the OpenSim inverse kinematics tool
+MOT_HEADER = """Coordinates
+version=1
+nRows=4
+nColumns=3
+inDegrees=yes
+
+Units are S.I. units (second, meters, Newtons, ...)
+If the header above contains a line with 'inDegrees', this indicates whether rotational values \
+are in degrees (yes) or radians (no).
+
+endheader
+time\tshoulder_elv\telbow_flexion
+"""
+
+
+def test_write_trc_round_trip(tmp_path):
+    reference = DATA / 'markers.trc'
+    header = read_header(reference)
+    markers = read_trc(reference)
+    # (n_frames, n_markers * 3) -> (3, n_markers, n_frames)
+    data = markers.values.reshape(markers.shape[0], -1, 3).transpose(2, 1, 0)
+
+    output = tmp_path / 'markers.trc'
+    write_trc(
+        output, data, labels=header['labels'], rate=header['rate'],
+        unit=header['metadata']['Units'], time=markers.index.values, chunk_size=100
+    )
+
+    # identical apart from the path line
+    expected = reference.read_bytes().split(b'\n', 1)[1]
+    assert output.read_bytes().split(b'\n', 1)[1] == expected
+
+
+def test_write_trc_format_size(tmp_path, monkeypatch):
+    reference = DATA / 'markers.trc'
+    header = read_header(reference)
+    markers = read_trc(reference)
+    data = markers.values.reshape(markers.shape[0], -1, 3).transpose(2, 1, 0)
+
+    # blocks formatted by a few rows (even less than a row) at a time
+    for format_size in [1, 100]:
+        monkeypatch.setattr(fileio, 'FORMAT_SIZE', format_size)
+        output = tmp_path / f'markers_{format_size}.trc'
+        write_trc(
+            output, data, labels=header['labels'], rate=header['rate'],
+            unit=header['metadata']['Units'], time=markers.index.values, chunk_size=100
+        )
+        expected = reference.read_bytes().split(b'\n', 1)[1]
+        assert output.read_bytes().split(b'\n', 1)[1] == expected
+
+
+def test_read_header_mot(tmp_path):
+    motion = tmp_path / 'trial1.mot'
+    rows = [f'{0.5 + i * 0.01:.2f}\t{i * 10.0:.8f}\t{-i * 5.0:.8f}\n' for i in range(4)]
+    motion.write_text(MOT_HEADER + ''.join(rows))
+
+    header = read_header(motion)
+    assert header['labels'] == ['shoulder_elv', 'elbow_flexion']
+    assert header['first_time'] == 0.5
+    assert header['last_time'] == 0.53
+    assert np.isclose(header['rate'], 100)
+    assert header['n_frames'] == 4
+    assert header['metadata']['inDegrees'] == 'yes'
+
+    data = read_sto(motion)
+    assert data.shape == (4, 2)
+    assert data['elbow_flexion'].iloc[-1] == -15
+
+
+def test_read_header_trc():
+    header = read_header(DATA / 'markers.trc')
+    assert header['labels'][0] == 'boite:gauche_ext'
+    assert header['rate'] == 100
+    assert header['n_frames'] == 580
+    assert (header['first_time'], header['last_time']) == (0, 5.79)
+
+
+def test_time_windows():
+    windows = time_windows(0, 3, 3, overlap=0.5)
+    assert windows == [(0, 1.5, 0, 1), (0.5, 2.5, 1, 2), (1.5, 3, 2, 3)]
+    # the overlap is clipped to the time range
+    assert time_windows(1, 2, 1, overlap=0.5) == [(1, 2, 1, 2)]
+
+
+def test_stitch(tmp_path):
+    time = np.arange(301) / 100
+    data = np.vstack([np.sin(time), np.cos(time)])
+    labels = ['q1', 'q2']
+    write_sto(tmp_path / 'full.mot', data, labels, time=time, metadata={'inDegrees': 'yes'})
+
+    files, keeps = [], []
+    for i, (start, end, keep_start, keep_end) in enumerate(time_windows(0, 3, 4, overlap=0.2)):
+        selected = (time >= start - 1e-9) & (time <= end + 1e-9)
+        files.append(tmp_path / f'window{i}.mot')
+        keeps.append((keep_start, keep_end))
+        write_sto(
+            files[-1], data[:, selected], labels, time=time[selected],
+            metadata={'inDegrees': 'yes'}
+        )
+
+    stitch(files, tmp_path / 'stitched.mot', keeps)
+    assert (tmp_path / 'stitched.mot').read_text() == (tmp_path / 'full.mot').read_text()
+    assert read_header(tmp_path / 'stitched.mot')['n_frames'] == 301
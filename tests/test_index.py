@@ -0,0 +1,70 @@
+import os
+import time
+
+import pytest
+
+from pyosim.index import MTIME_GRANULARITY_NS, FileIndex, is_trial_file
+
+
+@pytest.fixture
+def project(tmp_path):
+    for istage in ['0_markers', '1_inverse_kinematic']:
+        (tmp_path / 'project' / 'dapo' / istage).mkdir(parents=True)
+    for itrial in ['trial1', 'trial2']:
+        (tmp_path / 'project' / 'dapo' / '0_markers' / f'{itrial}.trc').touch()
+    return tmp_path / 'project'
+
+
+def test_is_trial_file():
+    assert is_trial_file('wu_trial1.mot', 'trial1')
+    assert is_trial_file('trial1_StaticOptimization_force.sto', 'trial1')
+    assert is_trial_file('wu_trial1_StaticOptimization_force.sto', 'trial1')
+    assert not is_trial_file('trial10.mot', 'trial1')
+
+
+def test_relative_project_path(project, monkeypatch):
+    monkeypatch.chdir(project.parent)
+    index = FileIndex('project')
+    assert index.participants() == ['dapo']
+    assert index.trials('dapo') == ['trial1', 'trial2']
+
+    # absolute paths, as given by the tools, are keyed relative to the project
+    output = project / 'dapo' / '1_inverse_kinematic'
+    assert index.listdir(output) == {}
+    (output / 'trial1.mot').write_text('endheader')
+    index.record(output / 'trial1.mot')
+    assert index.files('dapo', '1_inverse_kinematic') == [output.resolve() / 'trial1.mot']
+    assert sorted(index.directories) == ['dapo/0_markers', 'dapo/1_inverse_kinematic']
+
+    # the saved index is usable from another working directory
+    index.save()
+    monkeypatch.chdir(project)
+    index = FileIndex('.')
+    assert index.files('dapo', '1_inverse_kinematic', suffix='.mot', trial='trial1') == [
+        output.resolve() / 'trial1.mot'
+    ]
+    assert index.table()['size'].tolist() == [0, 0, 9]
+
+
+def add_file_same_mtime(directory, name):
+    """Add a file to a directory without changing its mtime, as in a coarse timestamp tick"""
+    stat = os.stat(directory)
+    (directory / name).touch()
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_listdir_racy_mtime(project):
+    index = FileIndex(project)
+    output = project / 'dapo' / '1_inverse_kinematic'
+
+    # listed in the same tick as the last change: listed again
+    assert index.listdir(output) == {}
+    add_file_same_mtime(output, 'trial1.mot')
+    assert list(index.listdir(output)) == ['trial1.mot']
+
+    # listed well after the last change: the directory mtime is trusted
+    old = time.time_ns() - 10 * MTIME_GRANULARITY_NS
+    os.utime(output, ns=(old, old))
+    assert list(index.listdir(output)) == ['trial1.mot']
+    add_file_same_mtime(output, 'trial2.mot')
+    assert list(index.listdir(output)) == ['trial1.mot']
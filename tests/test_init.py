@@ -0,0 +1,58 @@
+import ast
+import subprocess
+import sys
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+import pyosim
+
+# the modules of the tools import opensim or pyomeca
+HEAVY = ('opensim', 'pyomeca')
+
+
+def test_lazy_imports():
+    code = (
+        'import sys, pyosim\n'
+        'pyosim.Conf, pyosim.ProjectStore, pyosim.FileIndex, pyosim.Pipeline, pyosim.read_trc\n'
+        f'print(sorted(set({HEAVY!r}).intersection(sys.modules)))\n'
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+        cwd=Path(pyosim.__file__).parent.parent
+    )
+    assert result.stdout.strip() == '[]'
+
+
+def module_definitions(module):
+    """Public names defined at the top level of a module, read without importing it"""
+    tree = ast.parse((Path(pyosim.__file__).parent / f'{module}.py').read_text())
+    functions, constants = set(), set()
+    for inode in tree.body:
+        if isinstance(inode, (ast.FunctionDef, ast.ClassDef)):
+            functions.add(inode.name)
+        elif isinstance(inode, ast.Assign):
+            constants.update(i.id for i in inode.targets if isinstance(i, ast.Name))
+    return (
+        {i for i in functions if not i.startswith('_')},
+        {i for i in constants if i.isupper() and not i.startswith('_')},
+    )
+
+
+@pytest.mark.parametrize('module', sorted(pyosim._SUBMODULES))
+def test_submodule_names(module):
+    names = set(pyosim._SUBMODULES[module])
+    functions, constants = module_definitions(module)
+    # the classes and functions of the module are exported, the names exported exist
+    assert functions <= names
+    assert names <= functions | constants
+
+    try:
+        imported = import_module(f'pyosim.{module}')
+    except ImportError as error:
+        if error.name not in HEAVY:
+            raise
+        pytest.skip(f'{error.name} is not installed')
+    for iname in names:
+        assert getattr(pyosim, iname) is getattr(imported, iname)
@@ -0,0 +1,61 @@
+import json
+import logging
+
+import pytest
+
+from pyosim import instrumentation
+from pyosim.instrumentation import JSONLinesSink, LoggingSink, measure, set_sink
+
+
+def test_no_sink():
+    set_sink(None)
+    with measure('InverseKinematics', 'trial1', 'solve') as measured:
+        pass
+    assert measured is instrumentation._NO_MEASURE
+
+
+def test_json_lines_sink(tmp_path):
+    sink = JSONLinesSink(tmp_path / 'events.jsonl')
+    with measure('InverseKinematics', 'trial1', 'load_model', sink=sink):
+        pass
+    with pytest.raises(ValueError):
+        with measure('InverseKinematics', 'trial1', 'solve', sink=sink):
+            raise ValueError
+
+    events = [json.loads(iline) for iline in (tmp_path / 'events.jsonl').read_text().splitlines()]
+    assert [(i['stage'], i['trial'], i['phase'], i['status']) for i in events] == [
+        ('InverseKinematics', 'trial1', 'load_model', 'ok'),
+        ('InverseKinematics', 'trial1', 'solve', 'error'),
+    ]
+    for ievent in events:
+        assert ievent['wall_time'] >= 0
+        assert ievent['cpu_time'] >= 0
+        if ievent['process_peak_rss'] is not None:
+            assert ievent['peak_rss_delta'] >= 0
+
+
+def test_default_sink(caplog):
+    set_sink(LoggingSink())
+    try:
+        with caplog.at_level(logging.INFO, logger='pyosim'):
+            with measure('Scale', 'dapo', 'solve'):
+                pass
+    finally:
+        set_sink(None)
+    event = json.loads(caplog.records[-1].getMessage())
+    assert (event['stage'], event['trial'], event['phase']) == ('Scale', 'dapo', 'solve')
+
+
+def test_peak_rss_delta():
+    if instrumentation.peak_rss() is None:
+        pytest.skip('peak RSS not available on this platform')
+    events = []
+    with measure('Model', None, 'allocate', sink=events.append):
+        data = bytearray(200 * 1024 * 1024)
+    del data
+    with measure('Model', None, 'noop', sink=events.append):
+        pass
+    allocate, noop = events
+    assert allocate['peak_rss_delta'] >= 100 * 1024 * 1024
+    assert noop['peak_rss_delta'] == 0
+    assert noop['process_peak_rss'] == allocate['process_peak_rss']
@@ -0,0 +1,61 @@
+import os
+
+from pyosim.manifest import Manifest, file_signature, inputs_signature
+
+
+def test_is_up_to_date(tmp_path):
+    trial, output = tmp_path / 'trial1.trc', tmp_path / 'trial1.mot'
+    trial.write_text('markers')
+    output.write_text('motion')
+
+    manifest = Manifest(tmp_path)
+    signature = inputs_signature([trial, None], params={'low_pass': 6})
+    assert not manifest.is_up_to_date('trial1', signature, [output])
+    manifest.record([('trial1', signature), None])
+
+    # read back from disk
+    manifest = Manifest(tmp_path)
+    assert manifest.is_up_to_date('trial1', signature, [output])
+    assert not manifest.is_up_to_date('trial1', signature, [])
+    assert not manifest.is_up_to_date(
+        'trial1', inputs_signature([trial], params={'low_pass': 5}), [output]
+    )
+
+    # changed input
+    trial.write_text('other markers')
+    changed = inputs_signature([trial], params={'low_pass': 6})
+    assert not manifest.is_up_to_date('trial1', changed, [output])
+
+    # missing output
+    output.unlink()
+    assert not manifest.is_up_to_date('trial1', signature, [output])
+
+
+def test_content_signature(tmp_path):
+    trial = tmp_path / 'trial1.trc'
+    trial.write_text('markers')
+    signature = inputs_signature([trial], content=True)
+
+    # touched but identical content: same content hash, different size and mtime signature
+    stat = os.stat(trial)
+    os.utime(trial, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert inputs_signature([trial], content=True) == signature
+    assert file_signature(trial) != [stat.st_size, stat.st_mtime_ns]
+
+    trial.write_text('markerz')
+    assert inputs_signature([trial], content=True) != signature
+
+
+def test_save_concurrent_writers(tmp_path):
+    Manifest(tmp_path).record([('trial1', {'v': 1}), ('trial2', {'v': 1})])
+
+    # two jobs loading the manifest at the same time
+    first, second = Manifest(tmp_path), Manifest(tmp_path)
+    second.record([('trial1', {'v': 2})])
+    first.record([('trial3', {'v': 2})])
+
+    # the stale entry of `first` does not overwrite the one refreshed by `second`
+    expected = {'trial1': {'v': 2}, 'trial2': {'v': 1}, 'trial3': {'v': 2}}
+    assert Manifest(tmp_path).entries == expected
+    assert first.entries == expected
+    assert not list(tmp_path.glob('*.tmp'))
@@ -0,0 +1,179 @@
+import multiprocessing
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from pyosim import parallel
+from pyosim.fileio import write_sto
+
+
+def _child_pool_map(queue):
+    queue.put(parallel.get_pool(1).map(abs, [-1, -2]))
+
+
+@pytest.mark.skipif(
+    'fork' not in multiprocessing.get_all_start_methods(), reason='requires fork'
+)
+def test_get_pool_in_forked_process():
+    pool = parallel.get_pool(1)
+    assert parallel.get_pool() is pool
+    try:
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        child = context.Process(target=_child_pool_map, args=(queue,))
+        child.start()
+        # the inherited pool has no handler threads in the child: using it would hang
+        assert queue.get(timeout=30) == [1, 2]
+        child.join(30)
+        assert child.exitcode == 0
+        assert parallel.get_pool() is pool
+    finally:
+        parallel.close_pool()
+
+
+def test_cost_model_update():
+    cost_model = parallel.CostModel(alpha=0.5, default=0.1)
+    assert cost_model.estimate('InverseKinematics', 100) == pytest.approx(10)
+
+    cost_model.update('InverseKinematics', 100, 2.0)
+    assert cost_model.costs['InverseKinematics'] == pytest.approx(0.02)
+    # exponential moving average
+    cost_model.update('InverseKinematics', 100, 4.0)
+    assert cost_model.costs['InverseKinematics'] == pytest.approx(0.5 * 0.04 + 0.5 * 0.02)
+
+    # skipped or up-to-date trials do not update the model
+    cost_model.update('InverseKinematics', 100, parallel.MIN_ELAPSED / 2)
+    cost_model.update('InverseKinematics', 0, 1.0)
+    assert cost_model.costs['InverseKinematics'] == pytest.approx(0.03)
+    assert cost_model.estimate('InverseKinematics', 10) == pytest.approx(0.3)
+
+
+def test_cost_model_save(tmp_path):
+    filename = tmp_path / 'costs' / 'costs.json'
+    first = parallel.CostModel(filename)
+    first.update('InverseKinematics', 10, 1.0)
+    first.update('InverseDynamics', 10, 1.0)
+    first.save()
+
+    # two jobs loading the costs at the same time
+    first, second = parallel.CostModel(filename), parallel.CostModel(filename)
+    second.update('InverseKinematics', 10, 2.0)
+    second.save()
+    first.update('StaticOptimization', 10, 3.0)
+    first.save()
+
+    costs = parallel.CostModel(filename).costs
+    # the stale cost of `first` does not overwrite the one updated by `second`
+    assert costs['InverseKinematics'] == pytest.approx(0.3 * 0.2 + 0.7 * 0.1)
+    assert costs['InverseDynamics'] == pytest.approx(0.1)
+    assert costs['StaticOptimization'] == pytest.approx(0.3)
+    assert first.costs == costs
+
+
+def test_cost_model_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cost_model = parallel.CostModel()
+    cost_model.update('InverseKinematics', 10, 1.0)
+    cost_model.save()
+    assert not list(tmp_path.iterdir())
+
+
+def test_cost_model_save_error(tmp_path):
+    (tmp_path / 'file').touch()
+    cost_model = parallel.CostModel(tmp_path / 'file' / 'costs.json')
+    cost_model.update('InverseKinematics', 10, 1.0)
+    with pytest.warns(UserWarning, match='cost model not saved'):
+        cost_model.save()
+
+
+def _sleep(duration, value):
+    time.sleep(duration)
+    return value
+
+
+def test_balanced_map():
+    tasks = [(0.2, 'a'), (0.01, 'b'), (0.1, 'c'), (0.3, 'd')]
+    try:
+        results = parallel.balanced_map(_sleep, tasks, costs=[i[0] for i in tasks], processes=2)
+    finally:
+        parallel.close_pool()
+    # in the order of the tasks, whatever the order of completion
+    assert [result for result, _ in results] == ['a', 'b', 'c', 'd']
+    assert all(elapsed >= duration for (_, elapsed), (duration, _) in zip(results, tasks))
+
+
+def test_dispatch(tmp_path):
+    cost_model = parallel.CostModel(tmp_path / 'costs.json')
+    try:
+        results = parallel.dispatch(
+            'Sleep', abs, [-1, 2, -3], n_frames=[10, 30, 20], cost_model=cost_model, processes=2
+        )
+    finally:
+        parallel.close_pool()
+    assert results == [1, 2, 3]
+    # too short to update the cost model
+    assert 'Sleep' not in cost_model.costs
+
+
+def _window(start, end):
+    time = np.arange(301) / 100
+    selected = (time >= start - 1e-9) & (time <= end + 1e-9)
+    return np.vstack([np.sin(time), np.cos(time)])[:, selected], time[selected]
+
+
+def _run_window(trial, time_range):
+    """Window of a trial written in a scratch file"""
+    output = parallel.scratch_file(trial.stem, suffix='.mot')
+    data, time = _window(*time_range)
+    write_sto(output, data, ['q1', 'q2'], time=time)
+    return f'{output}'
+
+
+def _run_window_analyses(trial, time_range):
+    """Window of a trial written in a scratch directory, one file per analysis"""
+    directory = parallel.scratch_folder(trial.stem)
+    data, time = _window(*time_range)
+    for ianalysis in ['force', 'activation']:
+        write_sto(directory / f'{trial.stem}_{ianalysis}.sto', data, ['q1', 'q2'], time=time)
+    return f'{directory}'
+
+
+@pytest.mark.parametrize('multi', [False, True])
+def test_run_windows(tmp_path, multi):
+    events = []
+    trials = [
+        (Path('trial1.mot'), (0, 3), tmp_path / 'outputs' / 'trial1.mot'),
+        (Path('trial2.mot'), (0.5, 2), tmp_path / 'outputs' / 'trial2.mot'),
+    ]
+    try:
+        parallel.run_windows(
+            'InverseKinematics', _run_window, trials, shards=4, overlap=0.2, multi=multi,
+            instrument=events.append
+        )
+    finally:
+        parallel.close_pool()
+
+    for itrial, time_range, output in trials:
+        data, time = _window(*time_range)
+        write_sto(tmp_path / itrial.name, data, ['q1', 'q2'], time=time)
+        assert output.read_text() == (tmp_path / itrial.name).read_text()
+    assert [(event['trial'], event['phase']) for event in events] == [
+        ('trial1', 'stitch'), ('trial2', 'stitch')
+    ]
+    if not multi:
+        # the results of the windows are removed
+        assert not list(parallel.scratch_dir().glob('trial*'))
+
+
+def test_run_windows_directories(tmp_path):
+    trials = [(Path('trial1.mot'), (0, 3), tmp_path / 'outputs')]
+    parallel.run_windows('StaticOptimization', _run_window_analyses, trials, shards=3, overlap=0.2)
+
+    data, time = _window(0, 3)
+    write_sto(tmp_path / 'expected.sto', data, ['q1', 'q2'], time=time)
+    for ianalysis in ['force', 'activation']:
+        output = tmp_path / 'outputs' / f'trial1_{ianalysis}.sto'
+        assert output.read_text() == (tmp_path / 'expected.sto').read_text()
+    assert not list(parallel.scratch_dir().glob('trial*'))
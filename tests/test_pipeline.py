@@ -0,0 +1,104 @@
+import time
+
+import pandas as pd
+import pytest
+
+from pyosim.conf import Conf
+from pyosim.pipeline import Pipeline, Stage
+
+
+def log(project_path, *fields):
+    with open(project_path / '_log.txt', 'a') as file:
+        file.write(f"{' '.join(str(i) for i in fields)} {time.perf_counter()}\n")
+
+
+def scale(project_path, participant, trial):
+    log(project_path, 'scale', participant, trial)
+    (project_path / participant / '_models' / 'wu_scaled.osim').touch()
+
+
+def inverse_kinematic(project_path, participant, trial):
+    log(project_path, 'inverse_kinematic', participant, trial)
+    if participant == 'davo' and trial == 'trial2':
+        raise RuntimeError('IK did not converge')
+    if participant == 'dapo' and trial == 'trial2':
+        return  # done without output
+    (project_path / participant / '1_inverse_kinematic' / f'wu_{trial}.mot').touch()
+
+
+def static_optimization(project_path, participant, trial):
+    log(project_path, 'static_optimization', participant, trial)
+    output = project_path / participant / '3_static_optimization'
+    (output / f'wu_{trial}_StaticOptimization_force.sto').touch()
+
+
+@pytest.fixture
+def conf(tmp_path):
+    rows = []
+    for iparticipant in ['dapo', 'davo']:
+        for idir in ['_models', '0_markers', '1_inverse_kinematic', '3_static_optimization']:
+            (tmp_path / iparticipant / idir).mkdir(parents=True)
+        for itrial in ['trial1', 'trial2']:
+            (tmp_path / iparticipant / '0_markers' / f'{itrial}.trc').touch()
+        rows.append({'participant': iparticipant, 'process': True, 'conf_file': None})
+    pd.DataFrame(rows).to_csv(tmp_path / '_conf.csv', index=False)
+    return Conf(tmp_path)
+
+
+def test_tasks(conf):
+    stages = [Stage('scale', scale), Stage('inverse_kinematic', inverse_kinematic)]
+    graph = Pipeline(conf, stages).tasks()
+    assert graph[('dapo', None, 'scale')] == set()
+    assert graph[('dapo', 'trial2', 'inverse_kinematic')] == {('dapo', None, 'scale')}
+    assert len(graph) == 6
+
+    with pytest.raises(ValueError):
+        Pipeline(conf, [Stage('inverse_kinematic', inverse_kinematic)])
+
+
+def test_run(conf):
+    stages = [
+        Stage('scale', scale),
+        Stage('inverse_kinematic', inverse_kinematic),
+        Stage('static_optimization', static_optimization),
+    ]
+    table = Pipeline(conf, stages, processes=2).run()
+    assert list(table.columns) == ['participant', 'trial', 'stage', 'status', 'duration', 'error']
+    status = {
+        (irow.participant, irow.trial if pd.notnull(irow.trial) else None, irow.stage): irow.status
+        for irow in table.itertuples()
+    }
+    assert status == {
+        ('dapo', None, 'scale'): 'done',
+        ('davo', None, 'scale'): 'done',
+        ('dapo', 'trial1', 'inverse_kinematic'): 'done',
+        ('dapo', 'trial2', 'inverse_kinematic'): 'done',
+        ('davo', 'trial1', 'inverse_kinematic'): 'done',
+        ('davo', 'trial2', 'inverse_kinematic'): 'failed',
+        ('dapo', 'trial1', 'static_optimization'): 'done',
+        # no motion file
+        ('dapo', 'trial2', 'static_optimization'): 'skipped',
+        ('davo', 'trial1', 'static_optimization'): 'done',
+        # failed dependency
+        ('davo', 'trial2', 'static_optimization'): 'skipped',
+    }
+
+    # each task started after the tasks it depends on
+    started = {}
+    for iline in (conf.project_path / '_log.txt').read_text().splitlines():
+        stage, participant, trial, tic = iline.split()
+        started[(participant, None if trial == 'None' else trial, stage)] = float(tic)
+    assert len(started) == 8
+    for (participant, trial, stage), tic in started.items():
+        if stage == 'inverse_kinematic':
+            assert tic > started[(participant, None, 'scale')]
+        elif stage == 'static_optimization':
+            assert tic > started[(participant, trial, 'inverse_kinematic')]
+
+    errors = table.set_index('stage').loc['inverse_kinematic', 'error'].dropna()
+    assert len(errors) == 1 and 'IK did not converge' in errors.iloc[0]
+    assert table['duration'].ge(0).all()
+    skipped = table.set_index(['participant', 'trial', 'stage'])['error']
+    assert skipped[('dapo', 'trial2', 'static_optimization')] == (
+        'no input in dapo/1_inverse_kinematic'
+    )
@@ -0,0 +1,53 @@
+import json
+
+import pandas as pd
+import pytest
+
+from pyosim.store import ProjectStore
+
+
+@pytest.fixture
+def project(tmp_path):
+    participant = tmp_path / 'dapo'
+    for idir in ['0_markers', '1_inverse_kinematic']:
+        (participant / idir).mkdir(parents=True)
+    for itrial in ['trial1', 'trial2']:
+        (participant / '0_markers' / f'{itrial}.trc').touch()
+    (participant / '1_inverse_kinematic' / 'trial1.mot').touch()
+    (participant / '_conf.json').write_text(
+        json.dumps({'model': 'wu', 'onset': {'trial1': [0.5, 2.5]}})
+    )
+    pd.DataFrame([{
+        'participant': 'dapo', 'sex': 'F', 'laterality': 'D', 'group': 1, 'mass': 60,
+        'height': 1650, 'conf_file': None, 'process': True,
+    }]).to_csv(tmp_path / '_conf.csv', index=False)
+    return tmp_path
+
+
+def test_import_layout(project):
+    with ProjectStore.from_project(project) as store:
+        assert store.get_participants_to_process() == ['dapo']
+        assert store.get_conf_field('dapo', ['model']) == 'wu'
+        assert store.onsets('dapo') == {'trial1': [0.5, 2.5]}
+        pending = store.pending('inverse_kinematic')
+        assert pending['trial'].tolist() == ['trial2']
+
+
+def test_import_layout_again(project):
+    with ProjectStore.from_project(project) as store:
+        store.set_status('dapo', 'trial2', 'inverse_kinematic')
+        store.set_status('dapo', 'trial1', 'static_optimization', 'failed')
+        store.set_onsets('dapo', {'trial2': [1, 2]})
+
+        # the onsets of `_conf.json` are updated, the other ones and the statuses are kept
+        conf = json.loads((project / 'dapo' / '_conf.json').read_text())
+        conf['onset']['trial1'] = [1.0, 3.0]
+        (project / 'dapo' / '_conf.json').write_text(json.dumps(conf))
+        store.import_layout(project)
+
+        assert store.onsets('dapo') == {'trial1': [1.0, 3.0], 'trial2': [1, 2]}
+        assert store.pending('inverse_kinematic').empty
+        status = store.query(
+            'SELECT trial, status FROM status WHERE stage = ?', ['static_optimization']
+        )
+        assert status.values.tolist() == [['trial1', 'failed']]